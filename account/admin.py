@@ -2,7 +2,7 @@ from __future__ import unicode_literals
 
 from django.contrib import admin
 
-from account.models import Account, SignupCode, AccountDeletion, EmailAddress
+from account.models import Account, SignupCode, AccountDeletion, EmailAddress, OutboxMessage
 
 
 class SignupCodeAdmin(admin.ModelAdmin):
@@ -29,7 +29,15 @@ class EmailAddressAdmin(AccountAdmin):
     search_fields = ["email", "user__username"]
 
 
+class OutboxMessageAdmin(admin.ModelAdmin):
+
+    list_display = ["subject", "to", "created", "attempts", "sent"]
+    list_filter = ["sent"]
+    search_fields = ["to", "subject"]
+
+
 admin.site.register(Account, AccountAdmin)
 admin.site.register(SignupCode, SignupCodeAdmin)
 admin.site.register(AccountDeletion, AccountDeletionAdmin)
 admin.site.register(EmailAddress, EmailAddressAdmin)
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
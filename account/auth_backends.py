@@ -5,8 +5,9 @@ from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
 
+from account import hashing
 from account.models import EmailAddress
-from account.utils import get_user_lookup_kwargs
+from account.utils import filter_by_username
 
 
 class UsernameAuthenticationBackend(ModelBackend):
@@ -14,32 +15,44 @@ class UsernameAuthenticationBackend(ModelBackend):
     def authenticate(self, **credentials):
         User = get_user_model()
         try:
-            lookup_kwargs = get_user_lookup_kwargs({
-                "{username}__iexact": credentials["username"]
-            })
-            user = User.objects.get(**lookup_kwargs)
+            user = filter_by_username(User.objects.all(), credentials["username"]).get()
         except (User.DoesNotExist, KeyError):
             return None
         else:
             try:
-                if user.check_password(credentials["password"]):
+                if hashing.check_password(user, credentials["password"]):
                     return user
-            except KeyError:
+            except (KeyError, hashing.HashingUnavailable):
                 return None
 
 
 class EmailAuthenticationBackend(ModelBackend):
 
-    def authenticate(self, **credentials):
+    # set to a list of user field names (e.g. ["password", "is_active",
+    # "last_login"]) to defer every other user column during authentication
+    user_fields = None
+
+    def get_queryset(self):
+        """
+        Returns the email addresses eligible for authentication, joined
+        with their user so a login attempt costs a single query.
+        """
         qs = EmailAddress.objects.filter(Q(primary=True) | Q(verified=True))
+        qs = qs.select_related("user")
+        if self.user_fields is not None:
+            qs = qs.only("user", *["user__{0}".format(field) for field in self.user_fields])
+        return qs
+
+    def authenticate(self, **credentials):
+        qs = self.get_queryset()
         try:
-            email_address = qs.get(email__iexact=credentials["username"])
+            email_address = qs.for_email(credentials["username"]).get()
         except (EmailAddress.DoesNotExist, KeyError):
             return None
         else:
             user = email_address.user
             try:
-                if user.check_password(credentials["password"]):
+                if hashing.check_password(user, credentials["password"]):
                     return user
-            except KeyError:
+            except (KeyError, hashing.HashingUnavailable):
                 return None
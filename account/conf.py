@@ -53,9 +53,33 @@ class AccountAppConf(AppConf):
     DELETION_EXPUNGE_CALLBACK = "account.callbacks.account_delete_expunge"
     DELETION_EXPUNGE_HOURS = 48
     HOOKSET = "account.hooks.AccountDefaultHookSet"
+    HOOKSET_INSTRUMENTED = False
     TIMEZONES = TIMEZONES
     LANGUAGES = LANGUAGES
     USE_AUTH_AUTHENTICATE = False
+    PREFERENCE_CACHE_TIMEOUT = None
+    PREFERENCE_CACHE_ALIAS = "default"
+    SESSION_PREFERENCES = False
+    USERNAME_CASE_INSENSITIVE_INDEX = False
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_RETRY_DELAY = 60
+    TOKEN_GENERATOR = "account.tokens.RandomTokenGenerator"
+    LOGIN_THROTTLE_ENABLED = False
+    LOGIN_THROTTLE_LIMIT = 10
+    LOGIN_THROTTLE_IP_LIMIT = 100
+    LOGIN_THROTTLE_WINDOW = 300
+    LOGIN_THROTTLE_CACHE_ALIAS = "default"
+    HASHING_EXECUTOR = None
+    HASHING_WORKERS = 4
+    HASHING_QUEUE_SIZE = 32
+    HASHING_TIMEOUT = 5
+    SPAN_RECORDER = "account.instrumentation.NullRecorder"
+    METRICS_DIR = None
+    METRICS_FLUSH_INTERVAL = 1
+    SLOW_QUERY_SAMPLE_RATE = 0
+    SLOW_QUERY_COUNT = 50
+    SLOW_QUERY_TIME = 0.5
+    SLOW_QUERY_TOP = 5
 
     def configure_deletion_mark_callback(self, value):
         return load_path_attr(value)
@@ -65,3 +89,9 @@ class AccountAppConf(AppConf):
 
     def configure_hookset(self, value):
         return load_path_attr(value)()
+
+    def configure_token_generator(self, value):
+        return load_path_attr(value)()
+
+    def configure_span_recorder(self, value):
+        return load_path_attr(value)()
@@ -1,12 +1,12 @@
 from __future__ import unicode_literals
 
 from account.conf import settings
-from account.models import Account
+from account.middleware import get_account
 
 
 def account(request):
     ctx = {
-        "account": Account.for_request(request),
+        "account": get_account(request),
         "ACCOUNT_OPEN_SIGNUP": settings.ACCOUNT_OPEN_SIGNUP,
     }
     return ctx
@@ -13,10 +13,11 @@ from django.utils.translation import ugettext_lazy as _
 from django.contrib import auth
 from django.contrib.auth import get_user_model
 
+from account import hashing, throttling
 from account.conf import settings
 from account.hooks import hookset
 from account.models import EmailAddress
-from account.utils import get_user_lookup_kwargs
+from account.utils import filter_by_username
 
 
 alnum_re = re.compile(r"^\w+$")
@@ -52,17 +53,14 @@ class SignupForm(forms.Form):
         if not alnum_re.search(self.cleaned_data["username"]):
             raise forms.ValidationError(_("Usernames can only contain letters, numbers and underscores."))
         User = get_user_model()
-        lookup_kwargs = get_user_lookup_kwargs({
-            "{username}__iexact": self.cleaned_data["username"]
-        })
-        qs = User.objects.filter(**lookup_kwargs)
+        qs = filter_by_username(User.objects.all(), self.cleaned_data["username"])
         if not qs.exists():
             return self.cleaned_data["username"]
         raise forms.ValidationError(_("This username is already taken. Please choose another."))
 
     def clean_email(self):
         value = self.cleaned_data["email"]
-        qs = EmailAddress.objects.filter(email__iexact=value)
+        qs = EmailAddress.objects.for_email(value)
         if not qs.exists() or not settings.ACCOUNT_EMAIL_UNIQUE:
             return value
         raise forms.ValidationError(_("A user is registered with this email address."))
@@ -85,10 +83,21 @@ class LoginForm(forms.Form):
         required=False
     )
     user = None
+    throttled = False
+    throttled_message = _("Too many failed login attempts. Please try again later.")
+
+    def __init__(self, *args, **kwargs):
+        self.request = kwargs.pop("request", None)
+        super(LoginForm, self).__init__(*args, **kwargs)
 
     def clean(self):
         if self._errors:
             return
+        if settings.ACCOUNT_LOGIN_THROTTLE_ENABLED:
+            identifier = self.cleaned_data.get(self.identifier_field)
+            if throttling.is_throttled(identifier, throttling.get_client_ip(self.request)):
+                self.throttled = True
+                raise forms.ValidationError(self.throttled_message)
         user = auth.authenticate(**self.user_credentials())
         if user:
             if user.is_active:
@@ -153,7 +162,11 @@ class ChangePasswordForm(forms.Form):
         super(ChangePasswordForm, self).__init__(*args, **kwargs)
 
     def clean_password_current(self):
-        if not self.user.check_password(self.cleaned_data.get("password_current")):
+        try:
+            is_correct = hashing.check_password(self.user, self.cleaned_data.get("password_current"))
+        except hashing.HashingUnavailable:
+            raise forms.ValidationError(hashing.HashingUnavailable.error_message)
+        if not is_correct:
             raise forms.ValidationError(_("Please type your current password."))
         return self.cleaned_data["password_current"]
 
@@ -170,7 +183,7 @@ class PasswordResetForm(forms.Form):
 
     def clean_email(self):
         value = self.cleaned_data["email"]
-        if not EmailAddress.objects.filter(email__iexact=value).exists():
+        if not EmailAddress.objects.for_email(value).exists():
             raise forms.ValidationError(_("Email address can not be found."))
         return value
 
@@ -212,7 +225,7 @@ class SettingsForm(forms.Form):
         value = self.cleaned_data["email"]
         if self.initial.get("email") == value:
             return value
-        qs = EmailAddress.objects.filter(email__iexact=value)
+        qs = EmailAddress.objects.for_email(value)
         if not qs.exists() or not settings.ACCOUNT_EMAIL_UNIQUE:
             return value
         raise forms.ValidationError(_("A user is registered with this email address."))
@@ -0,0 +1,178 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+try:
+    from concurrent import futures
+except ImportError:  # Python 2 without the futures backport
+    futures = None
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import ugettext_lazy as _
+
+from django.contrib.auth import hashers
+
+from account.conf import settings
+
+
+class HashingUnavailable(Exception):
+    """
+    Raised when the hashing executor queue stays full, or a hash does not
+    complete, within ACCOUNT_HASHING_TIMEOUT.
+    """
+
+    error_message = _("The server is busy. Please try again in a moment.")
+
+
+class HashingExecutor(object):
+    """
+    Runs password hashers on a pool so the request thread only waits on a
+    future. At most ``queue_size`` hashes may be pending; callers beyond
+    that wait up to ``timeout`` seconds for a free slot.
+    """
+
+    def __init__(self, kind="thread", workers=4, queue_size=32, timeout=5):
+        if futures is None:
+            raise ImproperlyConfigured(
+                "ACCOUNT_HASHING_EXECUTOR requires concurrent.futures "
+                "(install the futures package on Python 2)"
+            )
+        if kind == "thread":
+            self.pool = futures.ThreadPoolExecutor(max_workers=workers)
+        elif kind == "process":
+            self.pool = futures.ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ImproperlyConfigured(
+                "ACCOUNT_HASHING_EXECUTOR must be None, \"thread\" or \"process\""
+            )
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def queue_depth(self):
+        return self.pending
+
+    def release(self, future=None):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def run(self, func, *args):
+        if not acquire(self.slots, self.timeout):
+            raise HashingUnavailable("hashing queue is full")
+        with self.lock:
+            self.pending += 1
+        try:
+            future = self.pool.submit(func, *args)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(self.release)
+        try:
+            return future.result(timeout=self.timeout)
+        except futures.TimeoutError:
+            raise HashingUnavailable("password hash did not complete in time")
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def acquire(semaphore, timeout):
+    try:
+        return semaphore.acquire(timeout=timeout)
+    except TypeError:  # Python 2 semaphores do not take a timeout
+        pass
+    deadline = time.time() + timeout
+    delay = 0.0005
+    while not semaphore.acquire(False):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        delay = min(delay * 2, remaining, 0.05)
+        time.sleep(delay)
+    return True
+
+
+_executor = None
+_executor_config = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the executor for the current settings or None when hashing
+    runs on the calling thread.
+    """
+    global _executor, _executor_config
+    config = (
+        settings.ACCOUNT_HASHING_EXECUTOR,
+        settings.ACCOUNT_HASHING_WORKERS,
+        settings.ACCOUNT_HASHING_QUEUE_SIZE,
+        settings.ACCOUNT_HASHING_TIMEOUT,
+    )
+    if config[0] is None:
+        return None
+    with _executor_lock:
+        if _executor_config != config:
+            if _executor is not None:
+                _executor.shutdown()
+            _executor = HashingExecutor(*config)
+            _executor_config = config
+        return _executor
+
+
+def queue_depth():
+    """
+    Returns the number of hashes submitted to the executor and not yet
+    finished.
+    """
+    executor = get_executor()
+    if executor is None:
+        return 0
+    return executor.queue_depth()
+
+
+def run(func, *args):
+    executor = get_executor()
+    if executor is None:
+        return func(*args)
+    return executor.run(func, *args)
+
+
+def check_password(user, raw_password):
+    """
+    Equivalent of ``user.check_password(raw_password)`` with the hasher
+    run on the hashing executor. Hash upgrades are saved the same way.
+    Without an executor the user's own method is called.
+    """
+    if get_executor() is None:
+        return user.check_password(raw_password)
+    encoded = user.password
+    if raw_password is None or not hashers.is_password_usable(encoded):
+        return False
+    is_correct = run(hashers.check_password, raw_password, encoded)
+    if is_correct:
+        preferred = hashers.get_hasher()
+        hasher = hashers.identify_hasher(encoded)
+        if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+            set_password(user, raw_password)
+            # hash upgrades are not password changes
+            user._password = None
+            user.save(update_fields=["password"])
+    return is_correct
+
+
+def set_password(user, raw_password):
+    """
+    Equivalent of ``user.set_password(raw_password)`` with the hasher run
+    on the hashing executor. Without an executor the user's own method is
+    called.
+    """
+    if get_executor() is None:
+        user.set_password(raw_password)
+        return
+    user.password = run(hashers.make_password, raw_password)
+    # Django >= 1.9 keeps the raw password to notify password validators
+    user._password = raw_password
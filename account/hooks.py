@@ -1,38 +1,131 @@
-import hashlib
+import contextlib
+import functools
 import random
 
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.apps import apps
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils import six, translation
 
 from account.conf import settings
+from account.instrumentation import timer
 
 
 class AccountDefaultHookSet(object):
 
+    email_templates = [
+        "account/email/invite_user_subject.txt",
+        "account/email/invite_user.txt",
+        "account/email/email_confirmation_subject.txt",
+        "account/email/email_confirmation_message.txt",
+        "account/email/password_change_subject.txt",
+        "account/email/password_change.txt",
+        "account/email/password_reset_subject.txt",
+        "account/email/password_reset.txt",
+    ]
+
     def send_invitation_email(self, to, ctx):
-        subject = render_to_string("account/email/invite_user_subject.txt", ctx)
-        message = render_to_string("account/email/invite_user.txt", ctx)
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, to)
+        subject, message = self.render_invitation_email(ctx)
+        self.deliver_email(subject, message, to)
+
+    def render_invitation_email(self, ctx):
+        return self.render_email(
+            "account/email/invite_user_subject.txt",
+            "account/email/invite_user.txt",
+            ctx
+        )
 
     def send_confirmation_email(self, to, ctx):
-        subject = render_to_string("account/email/email_confirmation_subject.txt", ctx)
-        subject = "".join(subject.splitlines())  # remove superfluous line breaks
-        message = render_to_string("account/email/email_confirmation_message.txt", ctx)
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, to)
+        subject, message = self.render_email(
+            "account/email/email_confirmation_subject.txt",
+            "account/email/email_confirmation_message.txt",
+            ctx
+        )
+        self.deliver_email(subject, message, to)
 
     def send_password_change_email(self, to, ctx):
-        subject = render_to_string("account/email/password_change_subject.txt", ctx)
-        subject = "".join(subject.splitlines())
-        message = render_to_string("account/email/password_change.txt", ctx)
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, to)
+        subject, message = self.render_email(
+            "account/email/password_change_subject.txt",
+            "account/email/password_change.txt",
+            ctx
+        )
+        self.deliver_email(subject, message, to)
 
     def send_password_reset_email(self, to, ctx):
-        subject = render_to_string("account/email/password_reset_subject.txt", ctx)
-        subject = "".join(subject.splitlines())
-        message = render_to_string("account/email/password_reset.txt", ctx)
+        subject, message = self.render_email(
+            "account/email/password_reset_subject.txt",
+            "account/email/password_reset.txt",
+            ctx
+        )
+        self.deliver_email(subject, message, to)
+
+    def render_email(self, subject_template_name, message_template_name, ctx):
+        subject = self.get_email_template(subject_template_name).render(ctx)
+        subject = "".join(subject.splitlines())  # remove superfluous line breaks
+        message = self.get_email_template(message_template_name).render(ctx)
+        return subject, message
+
+    def get_email_template(self, template_name):
+        """
+        Returns the compiled template, cached per process by template name
+        and active language (uncached when DEBUG is on).
+        """
+        if settings.DEBUG:
+            return get_template(template_name)
+        templates = self.__dict__.setdefault("_email_templates", {})
+        key = (template_name, translation.get_language())
+        try:
+            return templates[key]
+        except KeyError:
+            template = templates[key] = get_template(template_name)
+            return template
+
+    def warm_email_templates(self):
+        """
+        Loads ``email_templates`` into the template cache. Call at worker
+        start; templates the project does not provide are skipped.
+        """
+        for template_name in self.email_templates:
+            try:
+                self.get_email_template(template_name)
+            except TemplateDoesNotExist:
+                pass
+
+    def deliver_email(self, subject, message, to):
         send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, to)
 
-    def generate_random_token(self, extra=None, hash_func=hashlib.sha256):
+    @contextlib.contextmanager
+    def email_connection(self, connection=None):
+        """
+        Opens the given (or a new) mail connection for several
+        ``deliver_emails`` calls and closes it afterwards.
+        """
+        if connection is None:
+            connection = get_connection()
+        connection.open()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def deliver_emails(self, messages, connection=None):
+        """
+        Sends a list of ``(subject, message, to)`` tuples in one
+        ``send_messages`` call on the given (or a new) connection.
+        """
+        if connection is None:
+            connection = get_connection()
+        connection.send_messages([
+            EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, to, connection=connection)
+            for subject, message, to in messages
+        ])
+
+    def generate_random_token(self, extra=None, hash_func=None):
+        if hash_func is None:
+            return settings.ACCOUNT_TOKEN_GENERATOR.generate()
         if extra is None:
             extra = []
         bits = extra + [str(random.SystemRandom().getrandbits(512))]
@@ -44,6 +137,18 @@ class AccountDefaultHookSet(object):
             extra.append(email)
         return self.generate_random_token(extra)
 
+    def generate_signup_code_tokens(self, emails):
+        """
+        Returns one signup code token per email using the token generator's
+        bulk path, unless generate_signup_code_token or generate_random_token
+        has been overridden.
+        """
+        for name in ("generate_signup_code_token", "generate_random_token"):
+            default = six.get_unbound_function(getattr(AccountDefaultHookSet, name))
+            if six.get_unbound_function(getattr(type(self), name)) is not default:
+                return [self.generate_signup_code_token(email) for email in emails]
+        return settings.ACCOUNT_TOKEN_GENERATOR.generate_many(len(emails))
+
     def generate_email_confirmation_token(self, email):
         return self.generate_random_token([email])
 
@@ -53,11 +158,76 @@ class AccountDefaultHookSet(object):
             "password": form.cleaned_data["password"],
         }
 
+    def get_client_ip(self, request):
+        """
+        Returns the client address login throttling counts failures per.
+        Behind a reverse proxy ``REMOTE_ADDR`` is the proxy's own address;
+        override this to read the one the proxy forwards.
+        """
+        return request.META.get("REMOTE_ADDR")
+
+
+class OutboxHookSet(AccountDefaultHookSet):
+    """
+    Queues rendered emails in the outbox instead of sending them during the
+    request. Run the ``send_outbox`` management command to deliver them.
+    """
+
+    def deliver_email(self, subject, message, to):
+        OutboxMessage = apps.get_model("account", "OutboxMessage")
+        OutboxMessage.enqueue(subject, message, to)
+
+    @contextlib.contextmanager
+    def email_connection(self, connection=None):
+        # queueing needs no mail connection
+        yield connection
+
+    def deliver_emails(self, messages, connection=None):
+        OutboxMessage = apps.get_model("account", "OutboxMessage")
+        OutboxMessage.enqueue_many(messages)
+
 
 class HookProxy(object):
 
     def __getattr__(self, attr):
-        return getattr(settings.ACCOUNT_HOOKSET, attr)
+        value = getattr(settings.ACCOUNT_HOOKSET, attr)
+        if settings.ACCOUNT_HOOKSET_INSTRUMENTED and callable(value):
+            value = instrument_hook(attr, value)
+            # later lookups find the wrapper without reaching __getattr__
+            self.__dict__[attr] = value
+        return value
+
+    def clear_cache(self):
+        self.__dict__.clear()
+
+
+def instrument_hook(name, func):
+    """
+    Wraps a hook so every call is observed in the
+    ``account_hook_duration_seconds`` histogram and every exception counted
+    in ``account_hook_errors_total``.
+    """
+    from account.metrics import registry
+
+    labels = {"hook": name}
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = timer()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            registry.inc("account_hook_errors_total", labels=labels)
+            raise
+        finally:
+            registry.observe("account_hook_duration_seconds", timer() - start, labels)
+    return wrapper
 
 
 hookset = HookProxy()
+
+
+@receiver(setting_changed)
+def clear_hook_cache(sender, setting, **kwargs):
+    if setting in ("ACCOUNT_HOOKSET", "ACCOUNT_HOOKSET_INSTRUMENTED"):
+        hookset.clear_cache()
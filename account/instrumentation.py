@@ -0,0 +1,105 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from account.conf import settings
+
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+class NullRecorder(object):
+    """
+    Discards spans. Spans check ``enabled`` and skip timing altogether.
+    """
+
+    enabled = False
+
+    def record(self, name, duration, error=None):
+        pass
+
+
+class LoggingRecorder(object):
+    """
+    Logs every span to the ``account.instrumentation`` logger at DEBUG,
+    or at WARNING when the span raised.
+    """
+
+    enabled = True
+    logger = logging.getLogger("account.instrumentation")
+
+    def record(self, name, duration, error=None):
+        level = logging.WARNING if error is not None else logging.DEBUG
+        if self.logger.isEnabledFor(level):
+            self.logger.log(
+                level,
+                "%s took %.2fms%s",
+                name,
+                duration * 1000,
+                " ({0})".format(error.__name__) if error is not None else "",
+                extra={"span": name, "duration": duration, "error": error},
+            )
+
+
+class MemoryRecorder(object):
+    """
+    Aggregates count, total, min, max and errors per span name in process
+    memory. ``stats()`` returns a snapshot keyed by span name.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+
+    def record(self, name, duration, error=None):
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": duration,
+                    "max": duration,
+                    "errors": 0,
+                }
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["min"] = min(stats["min"], duration)
+            stats["max"] = max(stats["max"], duration)
+            if error is not None:
+                stats["errors"] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict((name, dict(stats)) for name, stats in self.spans.items())
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+
+
+class span(object):
+    """
+    Context manager timing the enclosed block and passing it to
+    ``settings.ACCOUNT_SPAN_RECORDER`` as ``name``::
+
+        with span("signup.create_user"):
+            ...
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.recorder = settings.ACCOUNT_SPAN_RECORDER
+        if self.recorder.enabled:
+            self.start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.recorder.enabled:
+            self.recorder.record(self.name, timer() - self.start, exc_type)
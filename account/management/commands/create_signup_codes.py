@@ -0,0 +1,60 @@
+from __future__ import unicode_literals
+
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.models import SignupCode
+from account.utils import chunked
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Create signup codes in bulk. Reads email addresses from the first "
+        "column of a CSV file (or stdin) and writes email,code rows to stdout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            default=None,
+            help="CSV file with email addresses in the first column; use - for stdin.",
+        )
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=0,
+            help="Number of codes to create without an email address.",
+        )
+        parser.add_argument("--max-uses", type=int, default=0)
+        parser.add_argument("--expiry", type=int, default=24, help="Expiry in hours.")
+        parser.add_argument("--notes", default="")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["file"] is None and not options["count"]:
+            raise CommandError("Pass --file and/or --count.")
+        params = {
+            "max_uses": options["max_uses"],
+            "expiry": options["expiry"],
+            "notes": options["notes"],
+            "chunk_size": options["chunk_size"],
+        }
+        writer = csv.writer(self.stdout, lineterminator="\n")
+        if options["file"] is not None:
+            if options["file"] == "-":
+                self.create(writer, sys.stdin, params)
+            else:
+                with open(options["file"]) as f:
+                    self.create(writer, f, params)
+        if options["count"]:
+            for signup_code in SignupCode.bulk_generate(n=options["count"], **params):
+                writer.writerow(["", signup_code.code])
+
+    def create(self, writer, f, params):
+        emails = (row[0].strip() for row in csv.reader(f) if row and "@" in row[0])
+        for chunk in chunked(emails, params["chunk_size"]):
+            for signup_code in SignupCode.bulk_generate(emails=chunk, **params):
+                writer.writerow([signup_code.email, signup_code.code])
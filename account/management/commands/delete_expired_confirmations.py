@@ -0,0 +1,22 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from account.models import EmailConfirmation
+
+
+class Command(BaseCommand):
+
+    help = "Delete email confirmations sent more than ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS ago."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of confirmations deleted per statement.",
+        )
+
+    def handle(self, *args, **options):
+        count = EmailConfirmation.objects.delete_expired_confirmations(batch_size=options["batch_size"])
+        self.stdout.write("{0} deleted.".format(count))
@@ -1,15 +1,88 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import multiprocessing
+import time
+
+import django
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from account.models import AccountDeletion
 
 
+def expunge_batch(pks):
+    return AccountDeletion.expunge_batch(pks)
+
+
 class Command(BaseCommand):
 
     help = "Expunge accounts deleted more than 48 hours ago."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of deletions expunged per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes expunging batches in parallel (requires a "
+                 "database that supports concurrent writers, i.e. not SQLite).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum number of deletions to expunge.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only count the deletions that would be expunged.",
+        )
+
     def handle(self, *args, **options):
-        count = AccountDeletion.expunge()
-        print("{0} expunged.".format(count))
+        start = time.time()
+        candidates = AccountDeletion.expunge_candidates(
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+        )
+        if options["dry_run"]:
+            count = sum(len(pks) for pks in candidates)
+            self.stdout.write("{0} would be expunged.".format(count))
+            return
+        if options["workers"] > 1:
+            count = self.expunge_parallel(candidates, options["workers"], options["verbosity"])
+        else:
+            count = 0
+            for pks in candidates:
+                count = self.report(count + AccountDeletion.expunge_batch(pks), options["verbosity"])
+        elapsed = time.time() - start
+        self.stdout.write("{0} expunged.".format(count))
+        self.stdout.write("{0:.2f} seconds, {1:.1f} rows/sec.".format(
+            elapsed,
+            count / elapsed if elapsed else 0.0,
+        ))
+
+    def expunge_parallel(self, candidates, workers, verbosity):
+        # forked workers must not share the parent's database connections
+        connections.close_all()
+        pool = multiprocessing.Pool(workers, initializer=django.setup)
+        try:
+            count = 0
+            for expunged in pool.imap_unordered(expunge_batch, candidates):
+                count = self.report(count + expunged, verbosity)
+        finally:
+            pool.close()
+            pool.join()
+        return count
+
+    def report(self, count, verbosity):
+        if verbosity > 1:
+            self.stdout.write("... {0} expunged".format(count))
+        return count
@@ -0,0 +1,36 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.conf import settings
+from account.metrics import registry
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Show call counts, errors and timings of hookset calls written to "
+        "ACCOUNT_METRICS_DIR by the server processes (requires "
+        "ACCOUNT_HOOKSET_INSTRUMENTED and ACCOUNT_METRICS_DIR)."
+    )
+
+    def handle(self, *args, **options):
+        if settings.ACCOUNT_METRICS_DIR is None:
+            raise CommandError(
+                "Set ACCOUNT_METRICS_DIR, the command reads the hook calls "
+                "recorded by the server processes from it."
+            )
+        stats = {}
+        for name, labels, value in registry.collect(flush=False):
+            if name == "account_hook_duration_seconds":
+                stats.setdefault(dict(labels)["hook"], [0, 0, 0.0])[1:] = [value[-1], value[-2]]
+            elif name == "account_hook_errors_total":
+                stats.setdefault(dict(labels)["hook"], [0, 0, 0.0])[0] = value
+        if not stats:
+            self.stdout.write("No hook calls recorded.")
+            return
+        self.stdout.write("{0:<40} {1:>8} {2:>7} {3:>10} {4:>10}".format("hook", "calls", "errors", "mean ms", "total s"))
+        for hook, (errors, calls, total) in sorted(stats.items(), key=lambda item: -item[1][2]):
+            self.stdout.write("{0:<40} {1:>8} {2:>7} {3:>10.2f} {4:>10.3f}".format(
+                hook, calls, errors, total / calls * 1000 if calls else 0, total
+            ))
@@ -0,0 +1,35 @@
+from __future__ import unicode_literals
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.models import OutboxMessage
+
+
+class Command(BaseCommand):
+
+    help = "Deliver emails queued by account.hooks.OutboxHookSet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of messages fetched per batch.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=None,
+            help="Keep running and drain the outbox every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = OutboxMessage.send_queued(batch_size=options["batch_size"])
+            if sent or failed or options["interval"] is None:
+                self.stdout.write("{0} sent, {1} failed.".format(sent, failed))
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
@@ -1,9 +1,28 @@
 from __future__ import unicode_literals
 
+import datetime
+
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from account.conf import settings
+from account.utils import normalize_email
+
+
+class EmailAddressQuerySet(models.QuerySet):
+
+    def for_email(self, email):
+        """
+        Case-insensitive match on the email address using the indexed
+        ``normalized_email`` column. Matches nothing for ``None``.
+        """
+        if email is None:
+            return self.none()
+        return self.filter(normalized_email=normalize_email(email))
 
 
-class EmailAddressManager(models.Manager):
+class EmailAddressManager(models.Manager.from_queryset(EmailAddressQuerySet)):
 
     def add_email(self, user, email, **kwargs):
         confirm = kwargs.pop("confirm", False)
@@ -26,7 +45,19 @@ class EmailAddressManager(models.Manager):
 
 class EmailConfirmationManager(models.Manager):
 
-    def delete_expired_confirmations(self):
-        for confirmation in self.all():
-            if confirmation.key_expired():
-                confirmation.delete()
+    def delete_expired_confirmations(self, batch_size=1000):
+        """
+        Deletes confirmations sent (or, if never sent, created) more than
+        ``ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS`` ago, at most
+        ``batch_size`` rows per statement. Returns the number deleted.
+        """
+        cutoff = timezone.now() - datetime.timedelta(days=settings.ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS)
+        expired = self.filter(Q(sent__lte=cutoff) | Q(sent__isnull=True, created__lte=cutoff))
+        count = 0
+        while True:
+            pks = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            self.filter(pk__in=pks).delete()
+            count += len(pks)
+        return count
@@ -0,0 +1,296 @@
+from __future__ import unicode_literals
+
+import atexit
+import errno
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from account import hashing, signals
+from account.conf import settings
+
+
+logger = logging.getLogger("account.metrics")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry(object):
+    """
+    In-process counters, gauges and histograms behind a single lock. When
+    ``ACCOUNT_METRICS_DIR`` is set, each process periodically writes its
+    values to ``<dir>/account-<pid>.json`` and ``collect`` sums the files of
+    all processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.descriptions = {}
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.values = {}
+        self.last_flush = 0
+
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    def key(self, name, labels):
+        return (name, tuple(sorted(labels.items())) if labels else ())
+
+    def check_fork(self):
+        # a forked worker must not report its parent's values as its own
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, amount=1, labels=None):
+        key = self.key(name, labels)
+        with self.lock:
+            self.check_fork()
+            self.values[key] = self.values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def set(self, name, value, labels=None):
+        key = self.key(name, labels)
+        with self.lock:
+            self.check_fork()
+            self.values[key] = value
+        self.maybe_flush()
+
+    def observe(self, name, value, labels=None):
+        key = self.key(name, labels)
+        with self.lock:
+            self.check_fork()
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return [
+                (name, labels, list(value) if isinstance(value, list) else value)
+                for (name, labels), value in self.values.items()
+            ]
+
+    def maybe_flush(self):
+        if settings.ACCOUNT_METRICS_DIR is None:
+            return
+        if time.time() - self.last_flush < settings.ACCOUNT_METRICS_FLUSH_INTERVAL:
+            return
+        # metrics must never break the request that updated them
+        try:
+            self.flush(force=False)
+        except (IOError, OSError):
+            logger.exception("unable to write account metrics")
+
+    def flush(self, force=True):
+        """
+        Writes this process's values to the metrics directory. The file is
+        replaced atomically so readers never see a partial write. Unless
+        ``force`` is set, a flush that another thread completed within the
+        flush interval is not repeated.
+        """
+        directory = settings.ACCOUNT_METRICS_DIR
+        if directory is None:
+            return
+        with self.flush_lock:
+            if not force and time.time() - self.last_flush < settings.ACCOUNT_METRICS_FLUSH_INTERVAL:
+                return
+            self.set_gauges()
+            self.last_flush = time.time()
+            entries = [[name, labels, value] for name, labels, value in self.snapshot()]
+            path = os.path.join(directory, "account-{0}.json".format(self.pid))
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".account-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    json.dump(entries, fp)
+                os.rename(tmp, path)
+            except Exception:
+                os.unlink(tmp)
+                raise
+
+    def set_gauges(self):
+        key = self.key("account_hashing_queue_depth", None)
+        with self.lock:
+            self.values[key] = hashing.queue_depth()
+
+    def collect(self, flush=True):
+        """
+        Returns a list of ``(name, labels, value)`` summed over every process
+        writing to ``ACCOUNT_METRICS_DIR``, or this process's values when it
+        is not set. Gauges of processes that have exited are left out. With
+        ``flush=False`` the files are only read, so a process that has no
+        metrics of its own does not add one.
+        """
+        directory = settings.ACCOUNT_METRICS_DIR
+        if directory is None:
+            self.set_gauges()
+            return sorted(self.snapshot())
+        if flush:
+            self.flush()
+        totals = {}
+        for path in glob.glob(os.path.join(directory, "account-*.json")):
+            pid = int(os.path.basename(path)[8:-5])
+            try:
+                with open(path) as fp:
+                    entries = json.load(fp)
+            except (IOError, ValueError):
+                continue
+            alive = pid_exists(pid)
+            for name, labels, value in entries:
+                if not alive and self.descriptions.get(name, ("gauge",))[0] == "gauge":
+                    continue
+                key = (name, tuple(tuple(label) for label in labels))
+                if isinstance(value, list):
+                    total = totals.setdefault(key, [0] * len(value))
+                    totals[key] = [a + b for a, b in zip(total, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return sorted((name, labels, value) for (name, labels), value in totals.items())
+
+
+def pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+registry = Registry()
+registry.describe("account_signups_total", "counter", "Users signed up.")
+registry.describe("account_signup_failures_total", "counter", "Sign up attempts that did not validate.")
+registry.describe("account_logins_total", "counter", "Successful logins.")
+registry.describe("account_login_failures_total", "counter", "Login attempts that did not validate.")
+registry.describe("account_password_changes_total", "counter", "Passwords changed or reset.")
+registry.describe("account_email_confirmations_total", "counter", "Email addresses confirmed.")
+registry.describe("account_email_confirmations_sent_total", "counter", "Email confirmations sent.")
+registry.describe("account_span_duration_seconds", "histogram", "Duration of account view phases.")
+registry.describe("account_span_errors_total", "counter", "Account view phases that raised.")
+registry.describe("account_hashing_queue_depth", "gauge", "Password hashes pending on the hashing executor.")
+registry.describe("account_hook_duration_seconds", "histogram", "Duration of hookset calls.")
+registry.describe("account_hook_errors_total", "counter", "Hookset calls that raised.")
+
+
+@atexit.register
+def flush_at_exit():
+    if settings.ACCOUNT_METRICS_DIR is not None and os.getpid() == registry.pid:
+        registry.flush()
+
+
+class MetricsRecorder(object):
+    """
+    Span recorder observing span durations in the
+    ``account_span_duration_seconds`` histogram.
+    """
+
+    enabled = True
+
+    def record(self, name, duration, error=None):
+        registry.observe("account_span_duration_seconds", duration, {"span": name})
+        if error is not None:
+            registry.inc("account_span_errors_total", labels={"span": name})
+
+
+@receiver(signals.user_signed_up)
+def count_signup(sender, **kwargs):
+    registry.inc("account_signups_total")
+
+
+@receiver(signals.user_sign_up_attempt)
+def count_signup_attempt(sender, result, **kwargs):
+    if not result:
+        registry.inc("account_signup_failures_total")
+
+
+@receiver(signals.user_logged_in)
+def count_login(sender, **kwargs):
+    registry.inc("account_logins_total")
+
+
+@receiver(signals.user_login_attempt)
+def count_login_attempt(sender, result, **kwargs):
+    if not result:
+        registry.inc("account_login_failures_total")
+
+
+@receiver(signals.password_changed)
+def count_password_change(sender, **kwargs):
+    registry.inc("account_password_changes_total")
+
+
+@receiver(signals.email_confirmed)
+def count_email_confirmed(sender, **kwargs):
+    registry.inc("account_email_confirmations_total")
+
+
+@receiver(signals.email_confirmation_sent)
+def count_email_confirmation_sent(sender, **kwargs):
+    registry.inc("account_email_confirmations_sent_total")
+
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ""
+    return "{{{0}}}".format(",".join(
+        "{0}=\"{1}\"".format(key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for key, value in labels
+    ))
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(entries, descriptions):
+    """
+    Renders ``(name, labels, value)`` entries in the Prometheus text
+    exposition format.
+    """
+    lines = []
+    described = set()
+    for name, labels, value in entries:
+        if name not in described:
+            described.add(name)
+            kind, help_text = descriptions.get(name, ("untyped", ""))
+            lines.append("# HELP {0} {1}".format(name, help_text))
+            lines.append("# TYPE {0} {1}".format(name, kind))
+        if isinstance(value, list):
+            for bound, count in zip(BUCKETS, value):
+                lines.append("{0}_bucket{1} {2}".format(name, format_labels(labels, [("le", bound)]), count))
+            lines.append("{0}_bucket{1} {2}".format(name, format_labels(labels, [("le", "+Inf")]), value[-1]))
+            lines.append("{0}_sum{1} {2}".format(name, format_labels(labels), format_value(value[-2])))
+            lines.append("{0}_count{1} {2}".format(name, format_labels(labels), value[-1]))
+        else:
+            lines.append("{0}{1} {2}".format(name, format_labels(labels), format_value(value)))
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Serves the account metrics in the Prometheus text format. Route it
+    somewhere only your monitoring can reach.
+    """
+    return HttpResponse(
+        render(registry.collect(), registry.descriptions),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,12 +1,28 @@
 from __future__ import unicode_literals
 
+import logging
+import random
+
+from django.db import connections
 from django.utils import translation, timezone
 from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from django.views.generic import View
 
 from account.conf import settings
 from account.models import Account
 
 
+def get_account(request):
+    """
+    Attaches a lazy ``request.account`` shared by the middleware, context
+    processor and views. The account is looked up at most once per request.
+    """
+    if not hasattr(request, "account"):
+        request.account = SimpleLazyObject(lambda: Account.for_request(request))
+    return request.account
+
+
 class LocaleMiddleware(object):
     """
     This is a very simple middleware that parses a request
@@ -18,14 +34,13 @@ class LocaleMiddleware(object):
 
     def get_language_for_user(self, request):
         if request.user.is_authenticated():
-            try:
-                account = Account.objects.get(user=request.user)
-                return account.language
-            except Account.DoesNotExist:
-                pass
+            preferences = Account.preferences_for_request(request)
+            if preferences is not None:
+                return preferences["language"]
         return translation.get_language_from_request(request)
 
     def process_request(self, request):
+        get_account(request)
         translation.activate(self.get_language_for_user(request))
         request.LANGUAGE_CODE = translation.get_language()
 
@@ -43,11 +58,95 @@ class TimezoneMiddleware(object):
     """
 
     def process_request(self, request):
-        try:
-            account = getattr(request.user, "account", None)
-        except Account.DoesNotExist:
-            pass
-        else:
-            if account:
-                tz = settings.TIME_ZONE if not account.timezone else account.timezone
+        get_account(request)
+        if request.user.is_authenticated():
+            preferences = Account.preferences_for_request(request)
+            if preferences is not None:
+                tz = settings.TIME_ZONE if not preferences["timezone"] else preferences["timezone"]
                 timezone.activate(tz)
+
+
+class SlowQueryMiddleware(object):
+    """
+    Logs account views that run too many or too slow queries to the
+    ``account.slow`` logger. Only a sample of requests
+    (``ACCOUNT_SLOW_QUERY_SAMPLE_RATE``) is measured; for those, queries
+    are recorded even when ``DEBUG`` is off.
+    """
+
+    logger = logging.getLogger("account.slow")
+
+    def get_view(self, view_func):
+        """
+        Returns the class of a class-based view, or the view function.
+        """
+        view = getattr(view_func, "view_class", None)
+        if view is not None:
+            return view
+        # Django 1.8's as_view() does not set view_class, the class is only
+        # bound in the closure of the returned function
+        for cell in getattr(view_func, "__closure__", None) or ():
+            if isinstance(cell.cell_contents, type) and issubclass(cell.cell_contents, View):
+                return cell.cell_contents
+        return view_func
+
+    def is_account_view(self, view_func):
+        view = self.get_view(view_func)
+        if getattr(view, "__module__", "").startswith("account."):
+            return True
+        return any(klass.__module__.startswith("account.") for klass in getattr(view, "__mro__", ())[1:])
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if random.random() >= settings.ACCOUNT_SLOW_QUERY_SAMPLE_RATE:
+            return
+        if not self.is_account_view(view_func):
+            return
+        view = self.get_view(view_func)
+        request._account_slow_query = {
+            "view": "{0}.{1}".format(view.__module__, view.__name__),
+            "connections": [
+                (connection, connection.force_debug_cursor, len(connection.queries_log))
+                for connection in connections.all()
+            ],
+        }
+        for connection in connections.all():
+            connection.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        state = getattr(request, "_account_slow_query", None)
+        if state is None:
+            return response
+        del request._account_slow_query
+        queries = []
+        for connection, force_debug_cursor, start in state["connections"]:
+            connection.force_debug_cursor = force_debug_cursor
+            queries.extend(
+                dict(query, alias=connection.alias)
+                for query in list(connection.queries_log)[start:]
+            )
+        query_time = sum(float(query["time"]) for query in queries)
+        if len(queries) >= settings.ACCOUNT_SLOW_QUERY_COUNT or query_time >= settings.ACCOUNT_SLOW_QUERY_TIME:
+            self.log(request, response, state["view"], queries, query_time)
+        return response
+
+    def log(self, request, response, view, queries, query_time):
+        slowest = sorted(queries, key=lambda query: -float(query["time"]))[:settings.ACCOUNT_SLOW_QUERY_TOP]
+        self.logger.warning(
+            "%s ran %d queries in %.1fms",
+            view,
+            len(queries),
+            query_time * 1000,
+            extra={
+                "view": view,
+                "url_name": getattr(request.resolver_match, "url_name", None),
+                "path": request.path,
+                "status_code": response.status_code,
+                "user_id": request.user.pk if hasattr(request, "user") and request.user.is_authenticated() else None,
+                "query_count": len(queries),
+                "query_time": query_time,
+                "slowest_queries": [
+                    {"sql": query["sql"], "time": float(query["time"]), "alias": query["alias"]}
+                    for query in slowest
+                ],
+            }
+        )
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def backfill_normalized_email(apps, schema_editor):
+    EmailAddress = apps.get_model("account", "EmailAddress")
+    EmailAddress.objects.update(normalized_email=Lower("email"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0002_fix_str"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailaddress",
+            name="normalized_email",
+            field=models.CharField(default="", max_length=254, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_normalized_email, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="emailaddress",
+            name="normalized_email",
+            field=models.CharField(max_length=254, editable=False, db_index=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 from account.conf import settings
+from account.instrumentation import span
 from account.utils import handle_redirect_to_login
 
 
@@ -30,3 +31,21 @@ class LoginRequiredMixin(object):
             login_url=self.get_login_url(),
             next_url=self.get_next_url(),
         )
+
+
+class InstrumentedFormMixin(object):
+    """
+    Times POST handling as a ``span_name`` span and form validation as
+    ``<span_name>.validate``. Views add spans for their own phases.
+    """
+
+    span_name = None
+
+    def post(self, *args, **kwargs):
+        with span(self.span_name):
+            form = self.get_form(self.get_form_class())
+            with span("{0}.validate".format(self.span_name)):
+                valid = form.is_valid()
+            if valid:
+                return self.form_valid(form)
+            return self.form_invalid(form)
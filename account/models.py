@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 import datetime
+import itertools
 import operator
 
 try:
@@ -8,13 +9,15 @@ try:
 except ImportError:  # python 2
     from urllib import urlencode
 
+from django.core.cache import caches
+from django.core.mail import EmailMessage, get_connection
 from django.core.urlresolvers import reverse
 from django.db import models, transaction
-from django.db.models import Q
-from django.db.models.signals import post_save
+from django.db.models import F, Q
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone, translation, six
-from django.utils.encoding import python_2_unicode_compatible
+from django.utils.encoding import force_text, python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
 from django.contrib.auth.models import AnonymousUser
@@ -28,6 +31,7 @@ from account.fields import TimeZoneField
 from account.hooks import hookset
 from account.managers import EmailAddressManager, EmailConfirmationManager
 from account.signals import signup_code_sent, signup_code_used
+from account.utils import chunked, get_timezone, normalize_email
 
 
 @python_2_unicode_compatible
@@ -42,15 +46,78 @@ class Account(models.Model):
         default=settings.LANGUAGE_CODE
     )
 
+    SESSION_PREFERENCES_KEY = "_account_preferences"
+
     @classmethod
     def for_request(cls, request):
+        """
+        Returns the account for the user of the given request. The result is
+        memoized on the request so callers within the same request (the
+        middleware, context processor and views) share a single lookup.
+        """
         user = getattr(request, "user", None)
-        if user and user.is_authenticated():
+        authenticated = bool(user and user.is_authenticated())
+        cache_key = user.pk if authenticated else None
+        cached = getattr(request, "_cached_account", None)
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        account = None
+        if authenticated:
             try:
-                return Account._default_manager.get(user=user)
+                account = Account.for_user(user)
             except Account.DoesNotExist:
                 pass
-        return AnonymousAccount(request)
+            else:
+                # share the user instance already attached to the request
+                account.user = user
+        if account is None:
+            account = AnonymousAccount(request)
+        request._cached_account = (cache_key, account)
+        return account
+
+    @classmethod
+    def preferences_for_request(cls, request):
+        """
+        Returns a dict with the language and timezone of the request user or
+        None if the user has no account. With ACCOUNT_SESSION_PREFERENCES
+        enabled the values are read from a snapshot kept in the session,
+        which is written the first time it is missing.
+        """
+        session = None
+        if settings.ACCOUNT_SESSION_PREFERENCES:
+            session = getattr(request, "session", None)
+        if session is not None:
+            preferences = session.get(cls.SESSION_PREFERENCES_KEY)
+            if preferences and preferences.get("user") == force_text(request.user.pk):
+                return preferences
+        account = cls.for_request(request)
+        if not isinstance(account, Account):
+            return None
+        if session is not None:
+            account.store_preferences(session)
+        return account.preferences()
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns the account of the given user. When
+        ACCOUNT_PREFERENCE_CACHE_TIMEOUT is set the account is kept in the
+        configured cache and invalidated whenever it is saved or deleted.
+        """
+        timeout = settings.ACCOUNT_PREFERENCE_CACHE_TIMEOUT
+        if timeout is None:
+            return Account._default_manager.get(user=user)
+        cache = caches[settings.ACCOUNT_PREFERENCE_CACHE_ALIAS]
+        key = Account.preference_cache_key(user.pk)
+        account = cache.get(key)
+        if account is None:
+            account = Account._default_manager.get(user=user)
+            cache.set(key, account, timeout)
+        return account
+
+    @staticmethod
+    def preference_cache_key(user_id):
+        return "account.preferences:{0}".format(user_id)
 
     @classmethod
     def create(cls, request=None, **kwargs):
@@ -70,26 +137,104 @@ class Account(models.Model):
             EmailAddress.objects.add_email(account.user, account.user.email, **kwargs)
         return account
 
+    @classmethod
+    def bulk_create_for_users(cls, users, batch_size=500, **kwargs):
+        """
+        Creates accounts and primary email addresses for an iterable of saved
+        users with one bulk insert per model and batch. Users that already
+        have an account are skipped. No per-instance signals are sent, so
+        create users with ``bulk_create`` or ``ACCOUNT_CREATE_ON_SAVE``
+        disabled. Returns the number of accounts created.
+        """
+        create_email = kwargs.pop("create_email", True)
+        confirm_email = kwargs.pop("confirm_email", False)
+        kwargs.setdefault("language", settings.LANGUAGE_CODE)
+        count = 0
+        for batch in chunked(users, batch_size):
+            existing = set(
+                cls._default_manager.filter(
+                    user__in=[user.pk for user in batch]
+                ).values_list("user_id", flat=True)
+            )
+            batch = [user for user in batch if user.pk not in existing]
+            if not batch:
+                continue
+            with transaction.atomic():
+                cls._default_manager.bulk_create(
+                    [cls(user=user, **kwargs) for user in batch],
+                    batch_size=batch_size
+                )
+                if create_email:
+                    EmailAddress.objects.bulk_create(
+                        [
+                            EmailAddress(
+                                user=user,
+                                email=user.email,
+                                normalized_email=normalize_email(user.email),
+                                primary=True
+                            )
+                            for user in batch if user.email
+                        ],
+                        batch_size=batch_size
+                    )
+            if create_email and confirm_email:
+                email_addresses = EmailAddress.objects.filter(
+                    user__in=[user.pk for user in batch],
+                    primary=True,
+                    verified=False
+                )
+                for email_address in email_addresses:
+                    email_address.send_confirmation()
+            count += len(batch)
+        return count
+
     def __str__(self):
         return str(self.user)
 
+    def preferences(self):
+        return {
+            "user": force_text(self.user_id),
+            "language": self.language,
+            "timezone": self.timezone,
+        }
+
+    def store_preferences(self, session):
+        """
+        Stores a snapshot of the language and timezone in the given session
+        so the middleware can skip the account lookup on later requests.
+        """
+        session[self.SESSION_PREFERENCES_KEY] = self.preferences()
+
     def now(self):
         """
         Returns a timezone aware datetime localized to the account's timezone.
         """
-        now = datetime.datetime.utcnow().replace(tzinfo=pytz.timezone("UTC"))
+        now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
         timezone = settings.TIME_ZONE if not self.timezone else self.timezone
-        return now.astimezone(pytz.timezone(timezone))
+        return now.astimezone(get_timezone(timezone))
 
     def localtime(self, value):
         """
         Given a datetime object as value convert it to the timezone of
         the account.
         """
-        timezone = settings.TIME_ZONE if not self.timezone else self.timezone
-        if value.tzinfo is None:
-            value = pytz.timezone(settings.TIME_ZONE).localize(value)
-        return value.astimezone(pytz.timezone(timezone))
+        return self.localtime_many([value])[0]
+
+    def localtime_many(self, values):
+        """
+        Given an iterable of datetime objects convert each of them to the
+        timezone of the account. Timezones are resolved once for the batch.
+        """
+        tz = get_timezone(settings.TIME_ZONE if not self.timezone else self.timezone)
+        default_tz = None
+        result = []
+        for value in values:
+            if value.tzinfo is None:
+                if default_tz is None:
+                    default_tz = get_timezone(settings.TIME_ZONE)
+                value = default_tz.localize(value)
+            result.append(value.astimezone(tz))
+        return result
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -108,6 +253,17 @@ def user_post_save(sender, **kwargs):
         Account.create(user=user)
 
 
+@receiver([post_save, post_delete], sender=Account)
+def account_invalidate_preference_cache(sender, instance, **kwargs):
+    """
+    Drop the cached preferences of an account whenever it changes so the
+    next request picks up the new language and timezone.
+    """
+    if settings.ACCOUNT_PREFERENCE_CACHE_TIMEOUT is not None:
+        cache = caches[settings.ACCOUNT_PREFERENCE_CACHE_ALIAS]
+        cache.delete(Account.preference_cache_key(instance.user_id))
+
+
 @python_2_unicode_compatible
 class AnonymousAccount(object):
 
@@ -182,6 +338,68 @@ class SignupCode(models.Model):
             params["email"] = email
         return cls(**params)
 
+    @classmethod
+    def bulk_generate(cls, n=0, emails=None, chunk_size=500, **kwargs):
+        """
+        Creates ``n`` codes without an email plus one code per address in
+        ``emails`` using ``bulk_create``. Addresses that already have a code
+        (or repeat) are skipped. Collisions are checked with one ``IN`` query
+        per chunk for emails and one for tokens. Accepts the ``max_uses``,
+        ``expiry``, ``inviter`` and ``notes`` arguments of ``create``.
+        Returns the list of created codes.
+        """
+        expiry = timezone.now() + datetime.timedelta(hours=kwargs.get("expiry", 24))
+        params = {
+            "max_uses": kwargs.get("max_uses", 0),
+            "expiry": expiry,
+            "inviter": kwargs.get("inviter"),
+            "notes": kwargs.get("notes", ""),
+        }
+        created = []
+        seen = set()
+        for chunk in chunked(itertools.chain(emails or [], itertools.repeat(None, n)), chunk_size):
+            requested = [email for email in chunk if email]
+            if requested:
+                seen.update(cls._default_manager.filter(email__in=requested).values_list("email", flat=True))
+            chunk_emails = []
+            for email in chunk:
+                if email is None:
+                    chunk_emails.append(None)
+                elif email not in seen:
+                    seen.add(email)
+                    chunk_emails.append(email)
+            codes = cls.generate_unique_tokens(chunk_emails)
+            signup_codes = [
+                cls(code=code, email=email or "", **params)
+                for code, email in zip(codes, chunk_emails)
+            ]
+            created.extend(cls._default_manager.bulk_create(signup_codes, batch_size=chunk_size))
+        return created
+
+    @classmethod
+    def generate_unique_tokens(cls, emails):
+        """
+        Returns one token per email (which may be None) that does not collide
+        with other tokens in the list or with existing codes.
+        """
+        tokens = hookset.generate_signup_code_tokens(emails)
+        pending = list(range(len(tokens)))
+        while pending:
+            taken = set(cls._default_manager.filter(
+                code__in=[tokens[i] for i in pending]
+            ).values_list("code", flat=True))
+            pending_set = set(pending)
+            seen = set(token for i, token in enumerate(tokens) if i not in pending_set)
+            collisions = []
+            for i in pending:
+                if tokens[i] in taken or tokens[i] in seen:
+                    collisions.append(i)
+                seen.add(tokens[i])
+            for i in collisions:
+                tokens[i] = hookset.generate_signup_code_token(emails[i])
+            pending = collisions
+        return tokens
+
     @classmethod
     def check_code(cls, code):
         try:
@@ -203,14 +421,62 @@ class SignupCode(models.Model):
 
     def use(self, user):
         """
-        Add a SignupCode result attached to the given user.
+        Add a SignupCode result attached to the given user. The use count is
+        incremented by a single conditional UPDATE in the same transaction,
+        so concurrent sign ups cannot exceed max_uses. Raises InvalidCode if
+        the code was used up or expired in the meantime.
         """
-        result = SignupCodeResult()
-        result.signup_code = self
-        result.user = user
-        result.save()
+        with transaction.atomic():
+            updated = SignupCode._default_manager.filter(
+                Q(max_uses=0) | Q(use_count__lt=F("max_uses")),
+                Q(expiry__isnull=True) | Q(expiry__gte=timezone.now()),
+                pk=self.pk,
+            ).update(use_count=F("use_count") + 1)
+            if not updated:
+                raise self.InvalidCode()
+            result = SignupCodeResult()
+            result.signup_code = self
+            result.user = user
+            result.save()
+        self.use_count += 1
         signup_code_used.send(sender=result.__class__, signup_code_result=result)
 
+    @classmethod
+    def send_many(cls, signup_codes, chunk_size=100, **kwargs):
+        """
+        Sends invitations for an iterable of signup codes (codes without an
+        email are skipped). The site and signup URL are computed once, each
+        chunk is delivered with ``hookset.deliver_emails`` over the single
+        connection of ``hookset.email_connection`` and marked sent with one
+        UPDATE. Returns the number of invitations sent.
+        """
+        protocol = getattr(settings, "DEFAULT_HTTP_PROTOCOL", "http")
+        current_site = kwargs["site"] if "site" in kwargs else Site.objects.get_current()
+        signup_url = "{0}://{1}{2}".format(protocol, current_site.domain, reverse("account_signup"))
+        count = 0
+        with hookset.email_connection(kwargs.get("connection")) as connection:
+            signup_codes = (signup_code for signup_code in signup_codes if signup_code.email)
+            for chunk in chunked(signup_codes, chunk_size):
+                messages = []
+                for signup_code in chunk:
+                    ctx = {
+                        "signup_code": signup_code,
+                        "current_site": current_site,
+                        "signup_url": "{0}?{1}".format(signup_url, urlencode({"code": signup_code.code})),
+                    }
+                    ctx.update(kwargs.get("extra_ctx", {}))
+                    subject, message = hookset.render_invitation_email(ctx)
+                    messages.append((subject, message, [signup_code.email]))
+                hookset.deliver_emails(messages, connection=connection)
+                sent = timezone.now()
+                # codes from bulk_generate may have no pk, the code is unique
+                cls._default_manager.filter(code__in=[signup_code.code for signup_code in chunk]).update(sent=sent)
+                for signup_code in chunk:
+                    signup_code.sent = sent
+                    signup_code_sent.send(sender=SignupCode, signup_code=signup_code)
+                count += len(chunk)
+        return count
+
     def send(self, **kwargs):
         protocol = getattr(settings, "DEFAULT_HTTP_PROTOCOL", "http")
         current_site = kwargs["site"] if "site" in kwargs else Site.objects.get_current()
@@ -241,16 +507,13 @@ class SignupCodeResult(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     timestamp = models.DateTimeField(default=timezone.now)
 
-    def save(self, **kwargs):
-        super(SignupCodeResult, self).save(**kwargs)
-        self.signup_code.calculate_use_count()
-
 
 @python_2_unicode_compatible
 class EmailAddress(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     email = models.EmailField(max_length=254, unique=settings.ACCOUNT_EMAIL_UNIQUE)
+    normalized_email = models.CharField(max_length=254, db_index=True, editable=False)
     verified = models.BooleanField(_("verified"), default=False)
     primary = models.BooleanField(_("primary"), default=False)
 
@@ -265,6 +528,13 @@ class EmailAddress(models.Model):
     def __str__(self):
         return "{0} ({1})".format(self.email, self.user)
 
+    def save(self, **kwargs):
+        self.normalized_email = normalize_email(self.email)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "email" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"normalized_email"}
+        super(EmailAddress, self).save(**kwargs)
+
     def set_as_primary(self, conditional=False):
         old_primary = EmailAddress.objects.get_primary(self.user)
         if old_primary:
@@ -320,7 +590,8 @@ class EmailConfirmation(models.Model):
         return cls._default_manager.create(email_address=email_address, key=key)
 
     def key_expired(self):
-        expiration_date = self.sent + datetime.timedelta(days=settings.ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS)
+        sent = self.sent if self.sent is not None else self.created
+        expiration_date = sent + datetime.timedelta(days=settings.ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS)
         return expiration_date <= timezone.now()
     key_expired.boolean = True
 
@@ -366,17 +637,58 @@ class AccountDeletion(models.Model):
         verbose_name_plural = _("account deletions")
 
     @classmethod
-    def expunge(cls, hours_ago=None):
+    def expunge(cls, hours_ago=None, batch_size=100, limit=None, dry_run=False, progress=None):
+        """
+        Expunges deletions requested more than ``hours_ago`` hours ago, one
+        committed batch at a time. With ``dry_run`` the candidates are only
+        counted. ``progress`` is called with the running count after each
+        batch.
+        """
+        count = 0
+        for pks in cls.expunge_candidates(hours_ago, batch_size=batch_size, limit=limit):
+            count += len(pks) if dry_run else cls.expunge_batch(pks)
+            if progress is not None:
+                progress(count)
+        return count
+
+    @classmethod
+    def expunge_candidates(cls, hours_ago=None, batch_size=100, limit=None):
+        """
+        Yields lists of at most ``batch_size`` primary keys of deletions to
+        expunge, paginating on the primary key so no batch is held in memory
+        longer than needed.
+        """
         if hours_ago is None:
             hours_ago = settings.ACCOUNT_DELETION_EXPUNGE_HOURS
         before = timezone.now() - datetime.timedelta(hours=hours_ago)
-        count = 0
-        for account_deletion in cls.objects.filter(date_requested__lt=before, user__isnull=False):
-            settings.ACCOUNT_DELETION_EXPUNGE_CALLBACK(account_deletion)
-            account_deletion.date_expunged = timezone.now()
-            account_deletion.save()
-            count += 1
-        return count
+        qs = cls.objects.filter(date_requested__lt=before, user__isnull=False).order_by("pk")
+        last_pk = None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            pks = list(page.values_list("pk", flat=True)[:size])
+            if not pks:
+                break
+            yield pks
+            last_pk = pks[-1]
+            if remaining is not None:
+                remaining -= len(pks)
+
+    @classmethod
+    def expunge_batch(cls, pks):
+        """
+        Runs the expunge callback for the given deletions and marks them
+        expunged in a single transaction. Returns the number expunged.
+        """
+        with transaction.atomic():
+            deletions = list(
+                cls.objects.filter(pk__in=pks, user__isnull=False).select_related("user")
+            )
+            for account_deletion in deletions:
+                settings.ACCOUNT_DELETION_EXPUNGE_CALLBACK(account_deletion)
+            cls.objects.filter(pk__in=[d.pk for d in deletions]).update(date_expunged=timezone.now())
+        return len(deletions)
 
     @classmethod
     def mark(cls, user):
@@ -385,3 +697,105 @@ class AccountDeletion(models.Model):
         account_deletion.save()
         settings.ACCOUNT_DELETION_MARK_CALLBACK(account_deletion)
         return account_deletion
+
+
+@python_2_unicode_compatible
+class OutboxMessage(models.Model):
+
+    subject = models.TextField(_("subject"))
+    body = models.TextField(_("body"))
+    from_email = models.CharField(_("from email"), max_length=254)
+    to = models.TextField(_("to"))
+    created = models.DateTimeField(_("created"), default=timezone.now)
+    next_attempt = models.DateTimeField(_("next attempt"), default=timezone.now)
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    last_error = models.TextField(_("last error"), blank=True)
+    sent = models.DateTimeField(_("sent"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("outbox message")
+        verbose_name_plural = _("outbox messages")
+        index_together = [("sent", "next_attempt")]
+
+    def __str__(self):
+        return "{0} to {1}".format(self.subject, ", ".join(self.recipients()))
+
+    @classmethod
+    def enqueue(cls, subject, body, to, from_email=None):
+        if from_email is None:
+            from_email = settings.DEFAULT_FROM_EMAIL
+        return cls._default_manager.create(
+            subject=subject,
+            body=body,
+            from_email=from_email,
+            to="\n".join(to),
+        )
+
+    @classmethod
+    def enqueue_many(cls, messages, from_email=None):
+        """
+        Queues a list of ``(subject, body, to)`` tuples with one insert.
+        """
+        if from_email is None:
+            from_email = settings.DEFAULT_FROM_EMAIL
+        return cls._default_manager.bulk_create([
+            cls(subject=subject, body=body, from_email=from_email, to="\n".join(to))
+            for subject, body, to in messages
+        ])
+
+    @classmethod
+    def send_queued(cls, batch_size=100, connection=None):
+        """
+        Delivers due messages batch by batch over a single mail connection.
+        Failed messages are retried with exponential backoff until
+        ``ACCOUNT_OUTBOX_MAX_ATTEMPTS`` is reached. Returns a tuple of the
+        number of messages sent and failed.
+        """
+        if connection is None:
+            connection = get_connection()
+        sent = failed = 0
+        connection.open()
+        try:
+            while True:
+                messages = list(
+                    cls._default_manager.filter(
+                        sent__isnull=True,
+                        next_attempt__lte=timezone.now(),
+                        attempts__lt=settings.ACCOUNT_OUTBOX_MAX_ATTEMPTS,
+                    ).order_by("next_attempt", "pk")[:batch_size]
+                )
+                if not messages:
+                    break
+                delivered = []
+                for message in messages:
+                    try:
+                        connection.send_messages([message.as_email_message(connection)])
+                    except Exception as e:
+                        message.defer(e)
+                        failed += 1
+                    else:
+                        delivered.append(message.pk)
+                cls._default_manager.filter(pk__in=delivered).update(sent=timezone.now())
+                sent += len(delivered)
+        finally:
+            connection.close()
+        return sent, failed
+
+    def recipients(self):
+        return [address for address in self.to.split("\n") if address]
+
+    def as_email_message(self, connection=None):
+        return EmailMessage(
+            self.subject,
+            self.body,
+            self.from_email,
+            self.recipients(),
+            connection=connection,
+        )
+
+    def defer(self, error):
+        self.attempts += 1
+        delay = settings.ACCOUNT_OUTBOX_RETRY_DELAY * 2 ** (self.attempts - 1)
+        self.next_attempt = timezone.now() + datetime.timedelta(seconds=delay)
+        self.last_error = "{0}: {1}".format(error.__class__.__name__, error)
+        self.save(update_fields=["attempts", "next_attempt", "last_error"])
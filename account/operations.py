@@ -0,0 +1,84 @@
+from __future__ import unicode_literals
+
+from django.db.migrations.operations.base import Operation
+
+from django.contrib.auth import get_user_model
+
+from account.conf import settings
+
+
+class CreateLowerIndex(Operation):
+    """
+    Migration operation creating an index on ``LOWER(column)`` so
+    case-insensitive lookups can use an index. By default it indexes the
+    ``USERNAME_FIELD`` of ``AUTH_USER_MODEL``, for use together with
+    ``ACCOUNT_USERNAME_CASE_INSENSITIVE_INDEX``. Add it to a migration of
+    your project::
+
+        operations = [
+            CreateLowerIndex(),
+        ]
+
+    Expression indexes are supported by PostgreSQL and SQLite.
+    """
+
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, model=None, field=None, name=None):
+        self.model = model
+        self.field = field
+        self.name = name
+
+    def deconstruct(self):
+        kwargs = {}
+        for attr in ["model", "field", "name"]:
+            if getattr(self, attr) is not None:
+                kwargs[attr] = getattr(self, attr)
+        return (self.__class__.__name__, [], kwargs)
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def get_model(self, state):
+        if self.model is None:
+            return get_user_model()
+        return state.apps.get_model(*self.model.split("."))
+
+    def get_field_name(self, model):
+        if self.field is not None:
+            return self.field
+        return getattr(model, "USERNAME_FIELD", "username")
+
+    def get_index_name(self, connection, model, column):
+        if self.name is not None:
+            return self.name
+        name = "{0}_{1}_lower".format(model._meta.db_table, column)
+        return name[:connection.ops.max_name_length()]
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = self.get_model(to_state)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        column = model._meta.get_field(self.get_field_name(model)).column
+        quote_name = schema_editor.quote_name
+        schema_editor.execute("CREATE INDEX {0} ON {1} (LOWER({2}))".format(
+            quote_name(self.get_index_name(schema_editor.connection, model, column)),
+            quote_name(model._meta.db_table),
+            quote_name(column),
+        ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = self.get_model(from_state)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        column = model._meta.get_field(self.get_field_name(model)).column
+        schema_editor.execute("DROP INDEX {0}".format(
+            schema_editor.quote_name(self.get_index_name(schema_editor.connection, model, column))
+        ))
+
+    def describe(self):
+        return "Create LOWER() index on {0}.{1}".format(
+            self.model or settings.AUTH_USER_MODEL,
+            self.field or "USERNAME_FIELD",
+        )
@@ -6,7 +6,7 @@ import django.dispatch
 user_signed_up = django.dispatch.Signal(providing_args=["user", "form"])
 user_sign_up_attempt = django.dispatch.Signal(providing_args=["username", "email", "result"])
 user_logged_in = django.dispatch.Signal(providing_args=["user", "form"])
-user_login_attempt = django.dispatch.Signal(providing_args=["username", "result"])
+user_login_attempt = django.dispatch.Signal(providing_args=["username", "result", "request", "throttled"])
 signup_code_sent = django.dispatch.Signal(providing_args=["signup_code"])
 signup_code_used = django.dispatch.Signal(providing_args=["signup_code_result"])
 email_confirmed = django.dispatch.Signal(providing_args=["email_address"])
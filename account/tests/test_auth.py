@@ -1,8 +1,15 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase, override_settings
 
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 
+from account.auth_backends import EmailAuthenticationBackend
+from account.operations import CreateLowerIndex
+from account.utils import filter_by_username
+
 
 @override_settings(
     AUTHENTICATION_BACKENDS=[
@@ -56,3 +63,55 @@ class EmailAuthenticationBackendTestCase(TestCase):
         self.create_user("user1", "user1@example.com", "password")
         self.assertTrue(authenticate() is None)
         self.assertTrue(authenticate(username="user1@example.com") is None)
+        self.assertTrue(authenticate(username=None, password="password") is None)
+
+    def test_single_query(self):
+        self.create_user("user1", "user1@example.com", "password")
+        with self.assertNumQueries(1):
+            authed_user = authenticate(username="user1@example.com", password="password")
+            self.assertEqual(authed_user.username, "user1")
+
+    def test_user_fields(self):
+        self.create_user("user1", "user1@example.com", "password")
+        backend = EmailAuthenticationBackend()
+        backend.user_fields = ["password", "is_active"]
+        with self.assertNumQueries(1):
+            authed_user = backend.authenticate(username="user1@example.com", password="password")
+            self.assertTrue(authed_user.is_active)
+        self.assertIn("first_name", authed_user.get_deferred_fields())
+
+    def test_case_insensitive_auth(self):
+        created_user = self.create_user("user1", "User1@Example.com", "password")
+        authed_user = authenticate(username="USER1@example.COM", password="password")
+        self.assertTrue(authed_user is not None)
+        self.assertEqual(created_user.pk, authed_user.pk)
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=[
+        "account.auth_backends.UsernameAuthenticationBackend"
+    ],
+    ACCOUNT_USERNAME_CASE_INSENSITIVE_INDEX=True
+)
+class UsernameCaseInsensitiveIndexTestCase(TestCase):
+
+    def test_successful_auth(self):
+        created_user = User.objects.create_user("User1", password="password")
+        authed_user = authenticate(username="uSER1", password="password")
+        self.assertTrue(authed_user is not None)
+        self.assertEqual(created_user.pk, authed_user.pk)
+
+    def test_missing_username(self):
+        User.objects.create_user("User1", password="password")
+        self.assertTrue(authenticate(username=None, password="password") is None)
+
+    @skipUnless(connection.vendor == "sqlite", "uses SQLite EXPLAIN QUERY PLAN")
+    def test_lookup_uses_index(self):
+        operation = CreateLowerIndex()
+        with connection.schema_editor() as schema_editor:
+            operation.database_forwards("account", schema_editor, None, None)
+        sql, params = filter_by_username(User.objects.all(), "User1").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("auth_user_username_lower", plan)
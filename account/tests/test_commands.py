@@ -0,0 +1,98 @@
+import datetime
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from django.contrib.auth.models import User
+
+from account.models import AccountDeletion, EmailAddress, EmailConfirmation, SignupCode
+
+
+class ExpungeDeletedTestCase(TestCase):
+
+    def setUp(self):
+        requested = timezone.now() - datetime.timedelta(hours=72)
+        for i in range(5):
+            user = User.objects.create_user("user{0}".format(i), email="user{0}@example.com".format(i))
+            AccountDeletion.mark(user)
+        AccountDeletion.objects.update(date_requested=requested)
+
+    def call_command(self, *args):
+        out = StringIO()
+        call_command("expunge_deleted", *args, stdout=out)
+        return out.getvalue()
+
+    def test_expunge(self):
+        progress = []
+        count = AccountDeletion.expunge(batch_size=2, progress=progress.append)
+        self.assertEqual(count, 5)
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(AccountDeletion.objects.filter(date_expunged__isnull=True).count(), 0)
+
+    def test_expunge_limit(self):
+        self.assertEqual(AccountDeletion.expunge(batch_size=2, limit=3), 3)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_command(self):
+        output = self.call_command("--batch-size=2")
+        self.assertIn("5 expunged.", output)
+        self.assertIn("rows/sec", output)
+        self.assertEqual(User.objects.count(), 0)
+
+    def test_command_dry_run(self):
+        output = self.call_command("--dry-run", "--limit=4")
+        self.assertIn("4 would be expunged.", output)
+        self.assertEqual(User.objects.count(), 5)
+
+
+class DeleteExpiredConfirmationsTestCase(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user("user1", email="user1@example.com")
+        email_address = EmailAddress.objects.get(user=user)
+        expired = timezone.now() - datetime.timedelta(days=4)
+        for i in range(3):
+            EmailConfirmation.objects.create(email_address=email_address, key="expired{0}".format(i), sent=expired)
+        EmailConfirmation.objects.create(email_address=email_address, key="fresh", sent=timezone.now())
+        EmailConfirmation.objects.create(email_address=email_address, key="unsent")
+
+    def test_delete_expired_confirmations(self):
+        with self.assertNumQueries(2 * 2 + 1):
+            count = EmailConfirmation.objects.delete_expired_confirmations(batch_size=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            sorted(EmailConfirmation.objects.values_list("key", flat=True)),
+            ["fresh", "unsent"]
+        )
+
+    def test_old_unsent_deleted(self):
+        EmailConfirmation.objects.filter(key="unsent").update(
+            created=timezone.now() - datetime.timedelta(days=4)
+        )
+        self.assertEqual(EmailConfirmation.objects.delete_expired_confirmations(), 4)
+        self.assertEqual(list(EmailConfirmation.objects.values_list("key", flat=True)), ["fresh"])
+
+    def test_command(self):
+        out = StringIO()
+        call_command("delete_expired_confirmations", stdout=out)
+        self.assertIn("3 deleted.", out.getvalue())
+
+
+class CreateSignupCodesTestCase(TestCase):
+
+    def test_command(self):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write("email,name\na@example.com,A\nb@example.com,B\n")
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+        call_command("create_signup_codes", "--file", path, "--count=1", "--chunk-size=1", stdout=out)
+        rows = [line.split(",") for line in out.getvalue().splitlines()]
+        self.assertEqual([row[0] for row in rows], ["a@example.com", "b@example.com", ""])
+        self.assertEqual(SignupCode.objects.count(), 3)
+        self.assertEqual(SignupCode.objects.get(email="a@example.com").code, rows[0][1])
@@ -0,0 +1,160 @@
+import threading
+import time
+from unittest import skipIf
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.utils.http import int_to_base36
+
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+
+from account import hashing
+from account.auth_backends import UsernameAuthenticationBackend
+
+
+requires_futures = skipIf(hashing.futures is None, "concurrent.futures is not installed")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class HashingTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("foo", "foo@example.com", "bar")
+
+    def test_disabled(self):
+        self.assertIsNone(hashing.get_executor())
+        self.assertTrue(hashing.check_password(self.user, "bar"))
+        self.assertFalse(hashing.check_password(self.user, "baz"))
+        self.assertFalse(hashing.check_password(self.user, None))
+        self.assertEqual(hashing.queue_depth(), 0)
+
+    @requires_futures
+    @override_settings(ACCOUNT_HASHING_EXECUTOR="thread")
+    def test_thread_executor(self):
+        self.assertIsInstance(hashing.get_executor(), hashing.HashingExecutor)
+        hashing.set_password(self.user, "baz")
+        self.assertTrue(self.user.check_password("baz"))
+        self.assertTrue(hashing.check_password(self.user, "baz"))
+        backend = UsernameAuthenticationBackend()
+        self.user.save()
+        self.assertEqual(backend.authenticate(username="foo", password="baz"), self.user)
+        self.assertIsNone(backend.authenticate(username="foo", password="bar"))
+
+    @requires_futures
+    def test_hash_upgrade(self):
+        with self.settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.SHA1PasswordHasher"]):
+            self.user.set_password("bar")
+            self.user.save()
+        with self.settings(ACCOUNT_HASHING_EXECUTOR="thread", PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+            "django.contrib.auth.hashers.SHA1PasswordHasher",
+        ]):
+            self.assertTrue(hashing.check_password(self.user, "bar"))
+        self.assertTrue(User.objects.get(pk=self.user.pk).password.startswith("md5$"))
+
+    def fill_queue(self):
+        """
+        Occupies the only queue slot until the end of the test.
+        """
+        executor = hashing.get_executor()
+        started, finish = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            finish.wait()
+
+        def occupy():
+            try:
+                executor.run(slow)
+            except hashing.HashingUnavailable:
+                pass
+
+        thread = threading.Thread(target=occupy)
+        thread.start()
+        started.wait()
+        self.addCleanup(thread.join)
+        self.addCleanup(finish.set)
+
+    @requires_futures
+    @override_settings(ACCOUNT_HASHING_EXECUTOR="thread", ACCOUNT_HASHING_QUEUE_SIZE=1, ACCOUNT_HASHING_TIMEOUT=0.1)
+    def test_queue_full(self):
+        self.fill_queue()
+        self.assertEqual(hashing.queue_depth(), 1)
+        with self.assertRaises(hashing.HashingUnavailable):
+            hashing.check_password(self.user, "bar")
+        backend = UsernameAuthenticationBackend()
+        self.assertIsNone(backend.authenticate(username="foo", password="bar"))
+
+    @requires_futures
+    @override_settings(ACCOUNT_HASHING_EXECUTOR="thread", ACCOUNT_HASHING_QUEUE_SIZE=1, ACCOUNT_HASHING_TIMEOUT=0.1)
+    def test_queue_full_views(self):
+        busy = [str(hashing.HashingUnavailable.error_message)]
+        self.client.login(username="foo", password="bar")
+        self.fill_queue()
+        response = self.client.post(reverse("account_password"), {
+            "password_current": "bar",
+            "password_new": "baz",
+            "password_new_confirm": "baz",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["form"].errors["password_current"], busy)
+        response = self.client.post(reverse("account_password_reset_token", kwargs={
+            "uidb36": int_to_base36(self.user.pk),
+            "token": default_token_generator.make_token(self.user),
+        }), {"password": "baz", "password_confirm": "baz"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["form"].non_field_errors(), busy)
+        self.client.logout()
+        response = self.client.post(reverse("account_signup"), {
+            "username": "bar",
+            "password": "bar",
+            "password_confirm": "bar",
+            "email": "bar@example.com",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["form"].non_field_errors(), busy)
+        self.assertFalse(User.objects.filter(username="bar").exists())
+
+
+class Python2Semaphore(object):
+    """
+    Semaphore whose acquire does not take a timeout, as on Python 2.
+    """
+
+    def __init__(self, value):
+        self.semaphore = threading.Semaphore(value)
+
+    def acquire(self, blocking=True):
+        return self.semaphore.acquire(blocking)
+
+
+class AcquireTestCase(TestCase):
+
+    def test_timeout_without_timeout_argument(self):
+        semaphore = Python2Semaphore(1)
+        self.assertTrue(hashing.acquire(semaphore, 0.1))
+        start = time.time()
+        self.assertFalse(hashing.acquire(semaphore, 0.1))
+        self.assertLess(time.time() - start, 1)
+
+
+class CustomUser(object):
+
+    password = ""
+
+    def check_password(self, raw_password):
+        return raw_password == "custom"
+
+    def set_password(self, raw_password):
+        self.password = "custom$" + raw_password
+
+
+class CustomUserHashingTestCase(TestCase):
+
+    def test_user_methods_used_without_executor(self):
+        user = CustomUser()
+        hashing.set_password(user, "bar")
+        self.assertEqual(user.password, "custom$bar")
+        self.assertTrue(hashing.check_password(user, "custom"))
+        self.assertFalse(hashing.check_password(user, "bar"))
@@ -0,0 +1,188 @@
+import hashlib
+import shutil
+import tempfile
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone, translation
+from django.utils.six import StringIO
+
+from account import metrics
+from account.hooks import AccountDefaultHookSet, OutboxHookSet, hookset
+from account.tokens import RandomTokenGenerator
+from account.models import OutboxMessage
+
+
+class FailingEmailBackend(EmailBackend):
+
+    def send_messages(self, messages):
+        raise IOError("relay unavailable")
+
+
+@override_settings(ACCOUNT_HOOKSET=OutboxHookSet())
+class OutboxHookSetTestCase(TestCase):
+
+    def signup(self):
+        data = {
+            "username": "foo",
+            "password": "bar",
+            "password_confirm": "bar",
+            "email": "foobar@example.com",
+        }
+        self.client.post(reverse("account_signup"), data)
+
+    def test_signup_enqueues(self):
+        self.signup()
+        self.assertEqual(len(mail.outbox), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.recipients(), ["foobar@example.com"])
+        self.assertIsNone(message.sent)
+
+    def test_send_queued(self):
+        self.signup()
+        self.assertEqual(OutboxMessage.send_queued(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["foobar@example.com"])
+        self.assertIsNotNone(OutboxMessage.objects.get().sent)
+        self.assertEqual(OutboxMessage.send_queued(), (0, 0))
+
+    def test_send_queued_failure_backs_off(self):
+        self.signup()
+        self.assertEqual(OutboxMessage.send_queued(connection=FailingEmailBackend()), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.attempts, 1)
+        self.assertIn("relay unavailable", message.last_error)
+        self.assertGreater(message.next_attempt, timezone.now())
+        self.assertEqual(OutboxMessage.send_queued(), (0, 0))
+
+    def test_command(self):
+        self.signup()
+        out = StringIO()
+        call_command("send_outbox", stdout=out)
+        self.assertIn("1 sent, 0 failed.", out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class EmailTemplateCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.hookset = AccountDefaultHookSet()
+
+    def test_template_cached(self):
+        name = "account/email/invite_user.txt"
+        self.assertIs(self.hookset.get_email_template(name), self.hookset.get_email_template(name))
+        with translation.override("de"):
+            self.hookset.get_email_template(name)
+        self.assertIn((name, "de"), self.hookset._email_templates)
+
+    def test_warm_email_templates(self):
+        self.hookset.email_templates = self.hookset.email_templates + ["account/email/missing.txt"]
+        self.hookset.warm_email_templates()
+        cached = set(name for name, language in self.hookset._email_templates)
+        self.assertIn("account/email/invite_user.txt", cached)
+        self.assertNotIn("account/email/missing.txt", cached)
+
+    def test_render_email_subject_single_line(self):
+        subject, message = self.hookset.render_invitation_email({"signup_url": "http://example.com/"})
+        self.assertEqual(subject, "You are invited")
+        self.assertEqual(message, "http://example.com/\n")
+
+
+class RandomTokenGeneratorTestCase(TestCase):
+
+    def assertToken(self, token, length=64):
+        self.assertEqual(len(token), length)
+        int(token, 16)
+
+    def test_generate(self):
+        generator = RandomTokenGenerator()
+        tokens = set(generator.generate() for i in range(10))
+        self.assertEqual(len(tokens), 10)
+        for token in tokens:
+            self.assertToken(token)
+
+    def test_generate_many(self):
+        tokens = RandomTokenGenerator(length=32).generate_many(50)
+        self.assertEqual(len(set(tokens)), 50)
+        for token in tokens:
+            self.assertToken(token, 32)
+
+    def test_hookset_tokens(self):
+        hookset = AccountDefaultHookSet()
+        self.assertToken(hookset.generate_email_confirmation_token("user@example.com"))
+        self.assertToken(hookset.generate_random_token(hash_func=hashlib.sha256))
+        tokens = hookset.generate_signup_code_tokens([None, "user@example.com"])
+        self.assertEqual(len(tokens), 2)
+        for token in tokens:
+            self.assertToken(token)
+
+    def test_signup_code_tokens_overridden(self):
+        class PrefixedHookSet(AccountDefaultHookSet):
+            def generate_random_token(self, extra=None, hash_func=None):
+                return "prefix-" + super(PrefixedHookSet, self).generate_random_token(extra, hash_func)
+
+        tokens = PrefixedHookSet().generate_signup_code_tokens([None, "user@example.com"])
+        self.assertEqual(len(tokens), 2)
+        for token in tokens:
+            self.assertTrue(token.startswith("prefix-"))
+
+
+class FailingHookSet(AccountDefaultHookSet):
+
+    def get_user_credentials(self, form, identifier_field):
+        raise ValueError()
+
+
+class InstrumentedHookProxyTestCase(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.addCleanup(hookset.clear_cache)
+
+    def collected(self):
+        return dict(((name, labels), value) for name, labels, value in metrics.registry.collect())
+
+    def test_disabled(self):
+        hookset.generate_random_token()
+        self.assertNotIn("generate_random_token", hookset.__dict__)
+        self.assertNotIn(("account_hook_duration_seconds", (("hook", "generate_random_token"),)), self.collected())
+
+    @override_settings(ACCOUNT_HOOKSET_INSTRUMENTED=True)
+    def test_timed_and_cached(self):
+        hookset.generate_random_token()
+        hookset.generate_random_token()
+        self.assertIn("generate_random_token", hookset.__dict__)
+        histogram = self.collected()[("account_hook_duration_seconds", (("hook", "generate_random_token"),))]
+        self.assertEqual(histogram[-1], 2)
+        # attributes that are not hooks are passed through
+        self.assertEqual(hookset.email_templates, AccountDefaultHookSet.email_templates)
+
+    @override_settings(ACCOUNT_HOOKSET_INSTRUMENTED=True)
+    def test_errors_counted(self):
+        with override_settings(ACCOUNT_HOOKSET=FailingHookSet()):
+            with self.assertRaises(ValueError):
+                hookset.get_user_credentials(None, "username")
+        self.assertNotIn("get_user_credentials", hookset.__dict__)
+        self.assertEqual(self.collected()[("account_hook_errors_total", (("hook", "get_user_credentials"),))], 1)
+
+    @override_settings(ACCOUNT_HOOKSET_INSTRUMENTED=True)
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(ACCOUNT_METRICS_DIR=directory):
+            hookset.generate_random_token()
+            metrics.registry.flush()
+            # a flush by the command would overwrite the file with nothing
+            metrics.registry.reset()
+            out = StringIO()
+            call_command("hook_stats", stdout=out)
+        self.assertIn("generate_random_token", out.getvalue())
+
+    def test_command_requires_metrics_dir(self):
+        with self.assertRaises(CommandError):
+            call_command("hook_stats", stdout=StringIO())
@@ -0,0 +1,102 @@
+import logging
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from django.contrib.auth.models import User
+
+from account.instrumentation import LoggingRecorder, MemoryRecorder, NullRecorder, span
+from account.tests.utils import ListHandler
+
+
+class SpanTestCase(TestCase):
+
+    def test_memory_recorder(self):
+        recorder = MemoryRecorder()
+        with self.settings(ACCOUNT_SPAN_RECORDER=recorder):
+            with span("outer"):
+                with span("inner"):
+                    pass
+            with self.assertRaises(ValueError):
+                with span("inner"):
+                    raise ValueError()
+        stats = recorder.stats()
+        self.assertEqual(stats["outer"]["count"], 1)
+        self.assertEqual(stats["inner"]["count"], 2)
+        self.assertEqual(stats["inner"]["errors"], 1)
+        self.assertGreaterEqual(stats["outer"]["total"], stats["inner"]["min"])
+        recorder.reset()
+        self.assertEqual(recorder.stats(), {})
+
+    def test_null_recorder(self):
+        s = span("noop")
+        with s:
+            pass
+        self.assertIsInstance(s.recorder, NullRecorder)
+        self.assertFalse(hasattr(s, "start"))
+
+    def test_logging_recorder(self):
+        logger = logging.getLogger("account.instrumentation")
+        handler = ListHandler()
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            with self.settings(ACCOUNT_SPAN_RECORDER=LoggingRecorder()):
+                with span("logged"):
+                    pass
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+        self.assertEqual(len(handler.records), 1)
+        self.assertEqual(handler.records[0].span, "logged")
+        self.assertEqual(handler.records[0].levelno, logging.DEBUG)
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=["account.auth_backends.UsernameAuthenticationBackend"],
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class ViewSpanTestCase(TestCase):
+
+    def setUp(self):
+        self.recorder = MemoryRecorder()
+
+    def test_signup(self):
+        data = {
+            "username": "foo",
+            "password": "bar",
+            "password_confirm": "bar",
+            "email": "foobar@example.com",
+        }
+        with self.settings(ACCOUNT_SPAN_RECORDER=self.recorder):
+            self.client.post(reverse("account_signup"), data)
+        self.assertEqual(set(self.recorder.stats()), set([
+            "signup",
+            "signup.validate",
+            "signup.create_user",
+            "signup.save_user",
+            "signup.use_signup_code",
+            "signup.create_email_address",
+            "signup.create_account",
+            "signup.after_signup",
+            "signup.send_email_confirmation",
+            "signup.login_user",
+        ]))
+
+    def test_login(self):
+        User.objects.create_user("foo", "foo@example.com", "bar")
+        with self.settings(ACCOUNT_SPAN_RECORDER=self.recorder):
+            self.client.post(reverse("account_login"), {"username": "foo", "password": "wrong"})
+            self.client.post(reverse("account_login"), {"username": "foo", "password": "bar"})
+        stats = self.recorder.stats()
+        self.assertEqual(stats["login"]["count"], 2)
+        self.assertEqual(stats["login.validate"]["count"], 2)
+        self.assertEqual(stats["login.login_user"]["count"], 1)
+        self.assertEqual(stats["login.after_login"]["count"], 1)
+
+    def test_password_reset(self):
+        User.objects.create_user("foo", "foo@example.com", "bar")
+        with self.settings(ACCOUNT_SPAN_RECORDER=self.recorder):
+            self.client.post(reverse("account_password_reset"), {"email": "foo@example.com"})
+        self.assertEqual(self.recorder.stats()["password_reset.send_email"]["count"], 1)
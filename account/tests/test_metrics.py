@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase, override_settings
+
+from django.contrib.auth.models import User
+
+from account import metrics
+from account.tests.utils import ListHandler
+
+
+def values(entries):
+    return dict(((name, labels), value) for name, labels, value in entries)
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=["account.auth_backends.UsernameAuthenticationBackend"],
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_signal_counters(self):
+        User.objects.create_user("foo", "foo@example.com", "bar")
+        self.client.post(reverse("account_login"), {"username": "foo", "password": "wrong"})
+        self.client.post(reverse("account_login"), {"username": "foo", "password": "bar"})
+        collected = values(metrics.registry.collect())
+        self.assertEqual(collected[("account_login_failures_total", ())], 1)
+        self.assertEqual(collected[("account_logins_total", ())], 1)
+        self.assertEqual(collected[("account_hashing_queue_depth", ())], 0)
+
+    def test_span_histogram(self):
+        recorder = metrics.MetricsRecorder()
+        recorder.record("login", 0.02)
+        recorder.record("login", 3, error=ValueError)
+        collected = values(metrics.registry.collect())
+        histogram = collected[("account_span_duration_seconds", (("span", "login"),))]
+        self.assertEqual(histogram[metrics.BUCKETS.index(0.025)], 1)
+        self.assertEqual(histogram[metrics.BUCKETS.index(5.0)], 2)
+        self.assertEqual(histogram[-2:], [3.02, 2])
+        self.assertEqual(collected[("account_span_errors_total", (("span", "login"),))], 1)
+
+    def test_render(self):
+        metrics.registry.inc("account_logins_total", 2)
+        metrics.registry.observe("account_span_duration_seconds", 0.5, {"span": "signup"})
+        text = metrics.render(metrics.registry.collect(), metrics.registry.descriptions)
+        self.assertIn("# TYPE account_logins_total counter\naccount_logins_total 2\n", text)
+        self.assertIn('account_span_duration_seconds_bucket{span="signup",le="0.25"} 0\n', text)
+        self.assertIn('account_span_duration_seconds_bucket{span="signup",le="0.5"} 1\n', text)
+        self.assertIn('account_span_duration_seconds_bucket{span="signup",le="+Inf"} 1\n', text)
+        self.assertIn('account_span_duration_seconds_sum{span="signup"} 0.5\n', text)
+        self.assertEqual(text.count("# TYPE account_span_duration_seconds histogram"), 1)
+
+    def test_view(self):
+        metrics.registry.inc("account_signups_total")
+        response = metrics.metrics_view(RequestFactory().get("/metrics/"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertIn(b"account_signups_total 1\n", response.content)
+
+    def test_fork_resets(self):
+        metrics.registry.inc("account_signups_total")
+        metrics.registry.pid = -1
+        self.assertEqual(metrics.registry.snapshot(), [])
+
+    def test_multiprocess(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # a worker that has exited: its counters count, its gauges do not
+        with open(os.path.join(directory, "account-999999.json"), "w") as fp:
+            json.dump([
+                ["account_logins_total", [], 3],
+                ["account_hashing_queue_depth", [], 7],
+                ["account_span_duration_seconds", [["span", "login"]], [1] * len(metrics.BUCKETS) + [0.001, 1]],
+            ], fp)
+        with self.settings(ACCOUNT_METRICS_DIR=directory):
+            metrics.registry.inc("account_logins_total")
+            metrics.registry.observe("account_span_duration_seconds", 0.001, {"span": "login"})
+            self.assertTrue(os.path.exists(os.path.join(directory, "account-{0}.json".format(os.getpid()))))
+            collected = values(metrics.registry.collect())
+        self.assertEqual(collected[("account_logins_total", ())], 4)
+        self.assertEqual(collected[("account_hashing_queue_depth", ())], 0)
+        self.assertEqual(collected[("account_span_duration_seconds", (("span", "login"),))][-1], 2)
+
+    def test_concurrent_flushes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        errors = []
+
+        def work():
+            try:
+                for _ in range(200):
+                    metrics.registry.inc("account_logins_total")
+            except Exception as e:
+                errors.append(e)
+
+        with self.settings(ACCOUNT_METRICS_DIR=directory, ACCOUNT_METRICS_FLUSH_INTERVAL=0):
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            collected = values(metrics.registry.collect())
+        self.assertEqual(errors, [])
+        self.assertEqual(collected[("account_logins_total", ())], 1600)
+        self.assertEqual(os.listdir(directory), ["account-{0}.json".format(os.getpid())])
+
+    def test_flush_errors_not_raised(self):
+        handler = ListHandler()
+        logger = logging.getLogger("account.metrics")
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        # keep the expected traceback out of the test output
+        logger.propagate = False
+        self.addCleanup(setattr, logger, "propagate", True)
+        with self.settings(ACCOUNT_METRICS_DIR=os.path.join(tempfile.gettempdir(), "account-missing-dir")):
+            metrics.registry.inc("account_logins_total")
+        self.assertEqual(values(metrics.registry.collect())[("account_logins_total", ())], 1)
+        self.assertEqual(len(handler.records), 1)
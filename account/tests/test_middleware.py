@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone, translation
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+
+from account.context_processors import account as account_context_processor
+from account.middleware import LocaleMiddleware, SlowQueryMiddleware, TimezoneMiddleware
+from account.models import Account, AnonymousAccount
+from account.tests.utils import ListHandler
+
+
+class AccountForRequestTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user("user1", email="user1@example.com", password="password")
+        self.user.account.timezone = "America/Denver"
+        self.user.account.language = "de"
+        self.user.account.save()
+
+    def tearDown(self):
+        translation.deactivate()
+        timezone.deactivate()
+
+    def get_request(self, user):
+        request = self.factory.get("/")
+        request.user = User.objects.get(pk=user.pk) if user.is_authenticated() else user
+        return request
+
+    def test_for_request_memoized(self):
+        request = self.get_request(self.user)
+        with self.assertNumQueries(1):
+            account = Account.for_request(request)
+            self.assertIs(Account.for_request(request), account)
+            self.assertIs(request.user.account, account)
+        self.assertEqual(account.language, "de")
+
+    def test_for_request_anonymous(self):
+        request = self.get_request(AnonymousUser())
+        with self.assertNumQueries(0):
+            self.assertIsInstance(Account.for_request(request), AnonymousAccount)
+
+    def test_for_request_user_changed(self):
+        request = self.get_request(AnonymousUser())
+        self.assertIsInstance(Account.for_request(request), AnonymousAccount)
+        request.user = self.user
+        self.assertEqual(Account.for_request(request).pk, self.user.account.pk)
+
+    def test_middleware_and_context_processor_share_lookup(self):
+        request = self.get_request(self.user)
+        with self.assertNumQueries(1):
+            LocaleMiddleware().process_request(request)
+            TimezoneMiddleware().process_request(request)
+            ctx = account_context_processor(request)
+            self.assertEqual(ctx["account"].timezone, "America/Denver")
+        self.assertEqual(request.LANGUAGE_CODE, "de")
+
+
+@override_settings(ACCOUNT_SESSION_PREFERENCES=True)
+class SessionPreferencesTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user("user1", email="user1@example.com", password="password")
+        self.user.account.timezone = "America/Denver"
+        self.user.account.language = "de"
+        self.user.account.save()
+        self.session = SessionStore()
+
+    def tearDown(self):
+        translation.deactivate()
+        timezone.deactivate()
+
+    def get_request(self):
+        request = self.factory.get("/")
+        request.user = self.user
+        request.session = self.session
+        return request
+
+    def process_request(self, request):
+        LocaleMiddleware().process_request(request)
+        TimezoneMiddleware().process_request(request)
+
+    def test_warm_session_skips_account_lookup(self):
+        with self.assertNumQueries(1):
+            self.process_request(self.get_request())
+        with self.assertNumQueries(0):
+            request = self.get_request()
+            self.process_request(request)
+        self.assertEqual(request.LANGUAGE_CODE, "de")
+        self.assertEqual(timezone.get_current_timezone_name(), "America/Denver")
+
+    def test_snapshot_for_other_user_ignored(self):
+        other = User.objects.create_user("user2", password="password")
+        other.account.store_preferences(self.session)
+        with self.assertNumQueries(1):
+            request = self.get_request()
+            self.process_request(request)
+        self.assertEqual(request.LANGUAGE_CODE, "de")
+
+    def test_settings_update_refreshes_snapshot(self):
+        self.client.login(username="user1", password="password")
+        self.client.post("/settings/", {"email": "user1@example.com", "timezone": "Europe/Berlin", "language": "fr"})
+        preferences = self.client.session[Account.SESSION_PREFERENCES_KEY]
+        self.assertEqual(preferences["timezone"], "Europe/Berlin")
+        self.assertEqual(preferences["language"], "fr")
+
+    def test_login_stores_snapshot(self):
+        self.client.post("/login/", {"username": "user1", "password": "password"})
+        preferences = self.client.session[Account.SESSION_PREFERENCES_KEY]
+        self.assertEqual(preferences["language"], "de")
+
+
+@override_settings(
+    MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + ["account.middleware.SlowQueryMiddleware"],
+    ACCOUNT_SLOW_QUERY_SAMPLE_RATE=1,
+    ACCOUNT_SLOW_QUERY_COUNT=3,
+    ACCOUNT_SLOW_QUERY_TOP=2,
+)
+class SlowQueryMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        SlowQueryMiddleware.logger.addHandler(self.handler)
+        self.addCleanup(SlowQueryMiddleware.logger.removeHandler, self.handler)
+        User.objects.create_user("foo", "foo@example.com", "bar")
+        self.client.login(username="foo", password="bar")
+
+    def test_logged(self):
+        self.client.get(reverse("account_settings"))
+        self.assertEqual(len(self.handler.records), 1)
+        record = self.handler.records[0]
+        self.assertEqual(record.view, "account.views.SettingsView")
+        self.assertEqual(record.url_name, "account_settings")
+        self.assertGreaterEqual(record.query_count, 3)
+        self.assertEqual(len(record.slowest_queries), 2)
+        self.assertIn("sql", record.slowest_queries[0])
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_below_threshold(self):
+        with self.settings(ACCOUNT_SLOW_QUERY_COUNT=100):
+            self.client.get(reverse("account_settings"))
+        self.assertEqual(self.handler.records, [])
+
+    def test_not_sampled(self):
+        with self.settings(ACCOUNT_SLOW_QUERY_SAMPLE_RATE=0):
+            self.client.get(reverse("account_settings"))
+        self.assertEqual(self.handler.records, [])
+
+    def test_account_views_only(self):
+        from account.views import LoginView
+
+        class CustomLoginView(LoginView):
+            __module__ = "project.views"
+
+        def other_view(request):
+            pass
+        other_view.__module__ = "project.views"
+
+        middleware = SlowQueryMiddleware()
+        self.assertTrue(middleware.is_account_view(LoginView.as_view()))
+        self.assertTrue(middleware.is_account_view(CustomLoginView.as_view()))
+        self.assertFalse(middleware.is_account_view(other_view))
+        # as_view() of Django 1.8 does not set view_class
+        view = CustomLoginView.as_view()
+        del view.view_class
+        self.assertTrue(middleware.is_account_view(view))
@@ -0,0 +1,219 @@
+import datetime
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from django.contrib.auth.models import User
+
+import pytz
+
+from account.hooks import AccountDefaultHookSet, OutboxHookSet
+from account.models import Account, EmailAddress, EmailConfirmation, OutboxMessage, SignupCode
+from account import utils
+from account.utils import get_timezone, warm_timezone_cache
+
+
+@override_settings(ACCOUNT_PREFERENCE_CACHE_TIMEOUT=60)
+class AccountPreferenceCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("user1", email="user1@example.com", password="password")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_for_user_cached(self):
+        with self.assertNumQueries(1):
+            Account.for_user(self.user)
+        with self.assertNumQueries(0):
+            account = Account.for_user(self.user)
+        self.assertEqual(account.user_id, self.user.pk)
+
+    def test_save_invalidates(self):
+        account = Account.for_user(self.user)
+        account.language = "de"
+        account.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(Account.for_user(self.user).language, "de")
+
+    def test_delete_invalidates(self):
+        Account.for_user(self.user)
+        self.user.account.delete()
+        with self.assertRaises(Account.DoesNotExist):
+            Account.for_user(self.user)
+
+    @override_settings(ACCOUNT_PREFERENCE_CACHE_TIMEOUT=None)
+    def test_disabled(self):
+        Account.for_user(self.user)
+        with self.assertNumQueries(1):
+            Account.for_user(self.user)
+
+
+class AccountLocaltimeTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", email="user1@example.com", password="password")
+        self.account = self.user.account
+        self.account.timezone = "America/Denver"
+
+    def test_get_timezone_cached(self):
+        self.assertIs(get_timezone("America/Denver"), get_timezone("America/Denver"))
+
+    @override_settings(ACCOUNT_TIMEZONES=[("America/Denver", "Denver"), ("Mars/Olympus_Mons", "Olympus Mons")])
+    def test_warm_timezone_cache(self):
+        timezones = utils._timezones
+        utils._timezones = {}
+        self.addCleanup(setattr, utils, "_timezones", timezones)
+        warm_timezone_cache()
+        self.assertEqual(list(utils._timezones), ["America/Denver"])
+
+    def test_localtime_many(self):
+        aware = datetime.datetime(2016, 1, 1, 12, tzinfo=pytz.utc)
+        naive = datetime.datetime(2016, 1, 1, 12)
+        values = self.account.localtime_many([aware, naive])
+        self.assertEqual([value.tzinfo.zone for value in values], ["America/Denver"] * 2)
+        self.assertEqual(values[0], aware)
+        self.assertEqual(values[1], self.account.localtime(naive))
+
+    def test_now(self):
+        self.assertEqual(self.account.now().tzinfo.zone, "America/Denver")
+
+
+@override_settings(ACCOUNT_CREATE_ON_SAVE=False)
+class AccountBulkCreateTestCase(TestCase):
+
+    def create_users(self, count):
+        User.objects.bulk_create([
+            User(username="user{0}".format(i), email="user{0}@example.com".format(i))
+            for i in range(count)
+        ])
+        return list(User.objects.order_by("pk"))
+
+    def test_bulk_create_for_users(self):
+        users = self.create_users(25)
+        # per batch: existing check and two inserts inside a savepoint
+        with self.assertNumQueries(3 * 5):
+            count = Account.bulk_create_for_users(users, batch_size=10)
+        self.assertEqual(count, 25)
+        self.assertEqual(Account.objects.count(), 25)
+        self.assertEqual(EmailAddress.objects.filter(primary=True).count(), 25)
+
+    def test_existing_accounts_skipped(self):
+        users = self.create_users(5)
+        Account.create(user=users[0])
+        self.assertEqual(Account.bulk_create_for_users(users), 4)
+        self.assertEqual(EmailAddress.objects.filter(user=users[0]).count(), 1)
+
+    def test_confirm_email(self):
+        users = self.create_users(3)
+        Account.bulk_create_for_users(users, confirm_email=True)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(EmailConfirmation.objects.count(), 3)
+
+
+class EmailAddressNormalizedTestCase(TestCase):
+
+    def test_normalized_on_save(self):
+        user = User.objects.create_user("user1", email="User1@Example.com")
+        email_address = EmailAddress.objects.get(user=user)
+        self.assertEqual(email_address.normalized_email, "user1@example.com")
+        email_address.email = "Other@Example.com"
+        email_address.save(update_fields=["email"])
+        self.assertEqual(EmailAddress.objects.for_email("OTHER@example.com").get(), email_address)
+
+
+class SignupCodeSendManyTestCase(TestCase):
+
+    def create_codes(self, count):
+        for i in range(count):
+            SignupCode.create(email="invitee{0}@example.com".format(i)).save()
+        return SignupCode.objects.order_by("pk")
+
+    def test_send_many(self):
+        codes = self.create_codes(5)
+        # the codes themselves, then an UPDATE per chunk (the site is cached)
+        with self.assertNumQueries(1 + 3):
+            count = SignupCode.send_many(codes, chunk_size=2)
+        self.assertEqual(count, 5)
+        self.assertEqual(len(mail.outbox), 5)
+        code = codes[0]
+        self.assertEqual(mail.outbox[0].to, [code.email])
+        self.assertIn("code={0}".format(code.code), mail.outbox[0].body)
+        self.assertEqual(SignupCode.objects.filter(sent__isnull=True).count(), 0)
+
+    def test_send_many_outbox(self):
+        # queueing must not need a reachable mail server
+        with self.settings(
+            ACCOUNT_HOOKSET=OutboxHookSet(),
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=1,
+        ):
+            SignupCode.send_many(self.create_codes(3))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.count(), 3)
+
+    def test_send_many_bulk_generated(self):
+        codes = SignupCode.bulk_generate(emails=["a@example.com", "b@example.com"])
+        count = SignupCode.send_many(codes)
+        self.assertEqual(count, 2)
+        self.assertEqual(SignupCode.objects.filter(sent__isnull=True).count(), 0)
+
+
+class SignupCodeBulkGenerateTestCase(TestCase):
+
+    def test_bulk_generate(self):
+        SignupCode.create(email="existing@example.com").save()
+        emails = ["a@example.com", "b@example.com", "a@example.com", "existing@example.com"]
+        # emails check, tokens check and insert
+        with self.assertNumQueries(3):
+            created = SignupCode.bulk_generate(n=2, emails=emails, max_uses=1)
+        self.assertEqual(len(created), 4)
+        self.assertEqual(SignupCode.objects.count(), 5)
+        self.assertEqual(
+            sorted(SignupCode.objects.exclude(email="").values_list("email", flat=True)),
+            ["a@example.com", "b@example.com", "existing@example.com"]
+        )
+        self.assertEqual(len(set(SignupCode.objects.values_list("code", flat=True))), 5)
+
+    def test_token_collisions_regenerated(self):
+        SignupCode.create(code="taken").save()
+        tokens = iter(["taken", "fresh", "fresh", "other"])
+        with self.settings(ACCOUNT_HOOKSET=type(str("FixedHookSet"), (AccountDefaultHookSet,), {
+            "generate_signup_code_token": lambda self, email=None: next(tokens),
+        })()):
+            created = SignupCode.bulk_generate(n=2)
+        self.assertEqual(sorted(code.code for code in created), ["fresh", "other"])
+
+
+class SignupCodeUseTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", email="user1@example.com")
+
+    def test_use(self):
+        signup_code = SignupCode.create(max_uses=2)
+        signup_code.save()
+        signup_code.use(self.user)
+        self.assertEqual(signup_code.use_count, 1)
+        self.assertEqual(SignupCode.objects.get(pk=signup_code.pk).use_count, 1)
+        self.assertEqual(signup_code.signupcoderesult_set.count(), 1)
+
+    def test_use_exhausted(self):
+        signup_code = SignupCode.create(max_uses=1)
+        signup_code.save()
+        stale = SignupCode.objects.get(pk=signup_code.pk)
+        signup_code.use(self.user)
+        with self.assertRaises(SignupCode.InvalidCode):
+            stale.use(self.user)
+        self.assertEqual(SignupCode.objects.get(pk=signup_code.pk).use_count, 1)
+        self.assertEqual(signup_code.signupcoderesult_set.count(), 1)
+
+    def test_use_unlimited(self):
+        signup_code = SignupCode.create()
+        signup_code.save()
+        for i in range(3):
+            signup_code.use(self.user)
+        self.assertEqual(SignupCode.objects.get(pk=signup_code.pk).use_count, 3)
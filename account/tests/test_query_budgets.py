@@ -0,0 +1,209 @@
+import os
+import traceback
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.backends import utils
+from django.test import TestCase, override_settings
+from django.utils.http import int_to_base36
+
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sites.models import Site
+
+from account import urls
+from account.models import EmailAddress, EmailConfirmation
+
+
+ACCOUNT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# (url name, scenario, maximum queries). Each scenario is a method on
+# QueryBudgetTestCase named scenario_<scenario> returning the response of
+# the request being measured; anything it does before calling self.measure
+# is not counted. Lower a budget when a change saves a query, never raise
+# one without a reason in the commit message.
+BUDGETS = [
+    ("account_signup", "get", 0),
+    ("account_signup", "post", 14),
+    ("account_login", "get", 0),
+    ("account_login", "post", 8),
+    ("account_login", "post_invalid", 1),
+    ("account_logout", "get", 2),
+    ("account_logout", "post", 4),
+    ("account_confirm_email", "get", 1),
+    ("account_confirm_email", "post", 4),
+    ("account_password", "get", 2),
+    ("account_password", "post", 4),
+    ("account_password_reset", "get", 0),
+    ("account_password_reset", "post", 2),
+    ("account_password_reset", "post_many_users", 2),
+    ("account_password_reset_token", "get", 1),
+    ("account_password_reset_token", "post", 3),
+    ("account_settings", "get", 4),
+    ("account_settings", "post", 5),
+    ("account_settings", "post_many_email_addresses", 5),
+    ("account_delete", "get", 2),
+    ("account_delete", "post", 8),
+]
+
+
+class QueryRecorder(object):
+    """
+    Records the SQL executed while active together with the innermost
+    stack frames from the account package that issued it.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __enter__(self):
+        self.execute = utils.CursorDebugWrapper.execute
+        self.executemany = utils.CursorDebugWrapper.executemany
+        recorder = self
+
+        def execute(cursor, sql, params=None):
+            recorder.record(sql, params)
+            return recorder.execute(cursor, sql, params)
+
+        def executemany(cursor, sql, param_list):
+            recorder.record(sql, param_list)
+            return recorder.executemany(cursor, sql, param_list)
+
+        utils.CursorDebugWrapper.execute = execute
+        utils.CursorDebugWrapper.executemany = executemany
+        self.force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        utils.CursorDebugWrapper.execute = self.execute
+        utils.CursorDebugWrapper.executemany = self.executemany
+        connection.force_debug_cursor = self.force_debug_cursor
+
+    def record(self, sql, params):
+        if sql.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            return
+        origin = [
+            frame for frame in traceback.extract_stack()[:-2]
+            if frame[0].startswith(ACCOUNT_DIR) and not frame[0].startswith(TESTS_DIR)
+        ]
+        self.queries.append((sql, params, origin[-3:]))
+
+    def report(self):
+        lines = []
+        for i, (sql, params, origin) in enumerate(self.queries, 1):
+            lines.append("{0}. {1} {2!r}".format(i, sql, params))
+            for filename, lineno, name, line in origin:
+                lines.append("     {0}:{1} in {2}: {3}".format(
+                    os.path.relpath(filename, os.path.dirname(ACCOUNT_DIR)), lineno, name, line
+                ))
+        return "\n".join(lines)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    AUTHENTICATION_BACKENDS=["account.auth_backends.UsernameAuthenticationBackend"],
+)
+class QueryBudgetTestCase(TestCase):
+
+    def setUp(self):
+        # the current site is cached per process, count it as warm
+        Site.objects.clear_cache()
+        Site.objects.get_current()
+        self.user = User.objects.create_user("foo", "foo@example.com", "bar")
+        self.email_address = EmailAddress.objects.get(user=self.user)
+
+    def login(self):
+        self.client.login(username="foo", password="bar")
+
+    def measure(self, method, url, data=None):
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400)
+        return recorder
+
+    def scenario_get(self, name):
+        if name in ("account_logout", "account_password", "account_settings", "account_delete"):
+            self.login()
+        return self.measure("get", reverse(name, kwargs=self.url_kwargs(name)))
+
+    def url_kwargs(self, name):
+        if name == "account_confirm_email":
+            return {"key": EmailConfirmation.create(self.email_address).key}
+        if name == "account_password_reset_token":
+            return {
+                "uidb36": int_to_base36(self.user.pk),
+                "token": default_token_generator.make_token(self.user),
+            }
+        return {}
+
+    def scenario_post(self, name):
+        data = {
+            "account_signup": {
+                "username": "bar",
+                "password": "bar",
+                "password_confirm": "bar",
+                "email": "bar@example.com",
+            },
+            "account_login": {"username": "foo", "password": "bar"},
+            "account_password": {
+                "password_current": "bar",
+                "password_new": "baz",
+                "password_new_confirm": "baz",
+            },
+            "account_password_reset": {"email": "foo@example.com"},
+            "account_password_reset_token": {"password": "baz", "password_confirm": "baz"},
+            "account_settings": {"email": "foo@example.com", "timezone": "", "language": "en"},
+        }.get(name)
+        if name in ("account_logout", "account_password", "account_settings", "account_delete"):
+            self.login()
+        return self.measure("post", reverse(name, kwargs=self.url_kwargs(name)), data)
+
+    def scenario_post_invalid(self, name):
+        return self.measure("post", reverse(name), {"username": "foo", "password": "wrong"})
+
+    def scenario_post_many_users(self, name):
+        # addresses differing only in case all match the lookup
+        for i in range(20):
+            email = "".join(c.upper() if i >> j & 1 else c for j, c in enumerate("shared@example.com"))
+            User.objects.create_user("user{0}".format(i), email, "bar")
+        return self.measure("post", reverse(name), {"email": "shared@example.com"})
+
+    def scenario_post_many_email_addresses(self, name):
+        EmailAddress.objects.bulk_create([
+            EmailAddress(user=self.user, email="foo{0}@example.com".format(i), normalized_email="foo{0}@example.com".format(i))
+            for i in range(100)
+        ])
+        self.login()
+        return self.measure("post", reverse(name), {
+            "email": "foo@example.com",
+            "timezone": "",
+            "language": "en",
+        })
+
+    def check_budget(self, name, scenario, budget):
+        recorder = getattr(self, "scenario_{0}".format(scenario))(name)
+        if len(recorder.queries) > budget:
+            self.fail("{0} {1}: {2} queries, budget {3}\n{4}".format(
+                name, scenario, len(recorder.queries), budget, recorder.report()
+            ))
+
+    def test_every_view_budgeted(self):
+        names = set(pattern.name for pattern in urls.urlpatterns)
+        self.assertEqual(names - set(name for name, scenario, budget in BUDGETS), set())
+
+
+def budget_test(name, scenario, budget):
+    def test(self):
+        self.check_budget(name, scenario, budget)
+    return test
+
+
+for name, scenario, budget in BUDGETS:
+    setattr(
+        QueryBudgetTestCase,
+        str("test_{0}_{1}".format(name, scenario)),
+        budget_test(name, scenario, budget)
+    )
@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from django.contrib.auth.models import User
+
+from account import throttling
+from account.hooks import AccountDefaultHookSet
+
+
+class ForwardedForHookSet(AccountDefaultHookSet):
+
+    def get_client_ip(self, request):
+        return request.META["HTTP_X_FORWARDED_FOR"]
+
+
+@override_settings(
+    ACCOUNT_LOGIN_THROTTLE_ENABLED=True,
+    ACCOUNT_LOGIN_THROTTLE_LIMIT=3,
+    ACCOUNT_LOGIN_THROTTLE_IP_LIMIT=5,
+)
+class LoginThrottleTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user("foo", "foo@example.com", "bar")
+
+    def login(self, username="foo", password="wrong", ip="127.0.0.1"):
+        return self.client.post(
+            reverse("account_login"),
+            {"username": username, "password": password},
+            REMOTE_ADDR=ip
+        )
+
+    def test_failures_counted(self):
+        self.login()
+        self.login(username="FOO")
+        self.assertEqual(throttling.failures("identifier", "foo"), 2)
+        self.assertEqual(throttling.failures("ip", "127.0.0.1"), 2)
+
+    def test_identifier_limit(self):
+        for _ in range(3):
+            self.login()
+        response = self.login(password="bar")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context_data["form"].non_field_errors(),
+            ["Too many failed login attempts. Please try again later."]
+        )
+        self.assertNotIn("_auth_user_id", self.client.session)
+        # other identifiers from another address are unaffected
+        response = self.login(username="other", ip="10.0.0.1")
+        self.assertNotIn(
+            "Too many failed login attempts. Please try again later.",
+            response.context_data["form"].non_field_errors()
+        )
+
+    def test_throttled_attempts_not_counted(self):
+        for _ in range(3):
+            self.login()
+        response = self.login(password="bar")
+        self.assertTrue(response.context_data["form"].throttled)
+        self.assertEqual(throttling.failures("identifier", "foo"), 3)
+        self.assertEqual(throttling.failures("ip", "127.0.0.1"), 3)
+
+    def test_ip_limit(self):
+        for i in range(5):
+            self.login(username="user{0}".format(i))
+        self.assertTrue(throttling.is_throttled("foo", "127.0.0.1"))
+        self.assertFalse(throttling.is_throttled("foo", "10.0.0.1"))
+
+    def test_success_resets_identifier(self):
+        self.login()
+        self.login()
+        response = self.login(password="bar")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(throttling.failures("identifier", "foo"), 0)
+
+    def test_previous_window_weighted(self):
+        throttling.record_failure("foo")
+        window = 300
+        bucket_start = (int(throttling.time.time() // window) + 1) * window
+        # halfway through the next window half of the old count remains
+        self.assertEqual(throttling.failures("identifier", "foo", now=bucket_start + window / 2), 0.5)
+        self.assertEqual(throttling.failures("identifier", "foo", now=bucket_start + window), 0)
+
+    def test_client_ip_hook(self):
+        with self.settings(ACCOUNT_HOOKSET=ForwardedForHookSet()):
+            self.client.post(
+                reverse("account_login"),
+                {"username": "foo", "password": "wrong"},
+                REMOTE_ADDR="10.0.0.1",
+                HTTP_X_FORWARDED_FOR="192.0.2.1",
+            )
+        self.assertEqual(throttling.failures("ip", "192.0.2.1"), 1)
+        self.assertEqual(throttling.failures("ip", "10.0.0.1"), 0)
+
+    @override_settings(ACCOUNT_LOGIN_THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(4):
+            self.login()
+        self.assertEqual(throttling.failures("identifier", "foo"), 0)
+        response = self.login(password="bar")
+        self.assertEqual(response.status_code, 302)
@@ -50,6 +50,32 @@ class SignupViewTestCase(TestCase):
             response = self.client.post(reverse("account_signup"), data)
             self.assertEqual(response.status_code, 302)
 
+    def test_code_used_up_after_check(self):
+        signup_code = SignupCode.create(max_uses=1)
+        signup_code.save()
+        check_code = SignupCode.__dict__["check_code"]
+        self.addCleanup(setattr, SignupCode, "check_code", check_code)
+
+        def check_code_then_use_up(cls, code):
+            # simulate a concurrent sign up using the code after it was checked
+            checked = check_code.__get__(None, cls)(code)
+            SignupCode.objects.filter(pk=checked.pk).update(use_count=1)
+            return checked
+        SignupCode.check_code = classmethod(check_code_then_use_up)
+
+        with self.settings(ACCOUNT_OPEN_SIGNUP=False):
+            data = {
+                "username": "foo",
+                "password": "bar",
+                "password_confirm": "bar",
+                "email": "foobar@example.com",
+                "code": signup_code.code,
+            }
+            response = self.client.post(reverse("account_signup"), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.template_name, "account/signup_closed.html")
+        self.assertFalse(User.objects.filter(username="foo").exists())
+
     def test_invalid_code(self):
         with self.settings(ACCOUNT_OPEN_SIGNUP=False):
             data = {
@@ -1,6 +1,10 @@
 from django.conf.urls import include, url
 
+from account.forms import LoginEmailForm
+from account.views import LoginView
+
 
 urlpatterns = [
+    url(r"^login/email/$", LoginView.as_view(form_class=LoginEmailForm), name="account_login_email"),
     url(r"^", include("account.urls")),
 ]
@@ -0,0 +1,14 @@
+import logging
+
+
+class ListHandler(logging.Handler):
+    """
+    Keeps the records emitted to it, for assertions on log output.
+    """
+
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
@@ -0,0 +1,95 @@
+from __future__ import unicode_literals
+
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.utils.encoding import force_bytes
+
+from account.conf import settings
+from account.hooks import hookset
+from account.signals import user_logged_in, user_login_attempt
+from account.utils import get_form_data
+
+
+def get_cache():
+    return caches[settings.ACCOUNT_LOGIN_THROTTLE_CACHE_ALIAS]
+
+
+def get_client_ip(request):
+    return hookset.get_client_ip(request) if request is not None else None
+
+
+def get_limits(identifier, ip):
+    limits = []
+    if identifier:
+        limits.append(("identifier", identifier.lower(), settings.ACCOUNT_LOGIN_THROTTLE_LIMIT))
+    if ip:
+        limits.append(("ip", ip, settings.ACCOUNT_LOGIN_THROTTLE_IP_LIMIT))
+    return limits
+
+
+def cache_key(scope, value, bucket):
+    digest = hashlib.md5(force_bytes(value)).hexdigest()
+    return "account.throttle:{0}:{1}:{2}".format(scope, digest, bucket)
+
+
+def failures(scope, value, now=None):
+    """
+    Returns the number of failed attempts in the sliding window, estimated
+    from the current and previous fixed window counters.
+    """
+    window = settings.ACCOUNT_LOGIN_THROTTLE_WINDOW
+    if now is None:
+        now = time.time()
+    bucket = int(now // window)
+    current_key, previous_key = cache_key(scope, value, bucket), cache_key(scope, value, bucket - 1)
+    counts = get_cache().get_many([current_key, previous_key])
+    weight = 1 - (now % window) / float(window)
+    return counts.get(current_key, 0) + counts.get(previous_key, 0) * weight
+
+
+def is_throttled(identifier, ip=None):
+    for scope, value, limit in get_limits(identifier, ip):
+        if limit is not None and failures(scope, value) >= limit:
+            return True
+    return False
+
+
+def record_failure(identifier, ip=None):
+    cache = get_cache()
+    window = settings.ACCOUNT_LOGIN_THROTTLE_WINDOW
+    bucket = int(time.time() // window)
+    for scope, value, limit in get_limits(identifier, ip):
+        key = cache_key(scope, value, bucket)
+        # the counter must outlive the following window, which still reads it
+        cache.add(key, 0, timeout=window * 2)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=window * 2)
+
+
+def reset(identifier):
+    cache = get_cache()
+    bucket = int(time.time() // settings.ACCOUNT_LOGIN_THROTTLE_WINDOW)
+    cache.delete_many([
+        cache_key("identifier", identifier.lower(), bucket),
+        cache_key("identifier", identifier.lower(), bucket - 1),
+    ])
+
+
+@receiver(user_login_attempt)
+def login_attempt_failed(sender, username, result, **kwargs):
+    # attempts rejected by the throttle itself must not extend the lockout
+    if settings.ACCOUNT_LOGIN_THROTTLE_ENABLED and not result and not kwargs.get("throttled"):
+        record_failure(username, get_client_ip(kwargs.get("request")))
+
+
+@receiver(user_logged_in)
+def login_succeeded(sender, user, form, **kwargs):
+    if settings.ACCOUNT_LOGIN_THROTTLE_ENABLED:
+        identifier = get_form_data(form, getattr(form, "identifier_field", "username"))
+        if identifier:
+            reset(identifier)
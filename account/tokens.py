@@ -0,0 +1,23 @@
+from __future__ import unicode_literals
+
+import binascii
+import os
+
+
+class RandomTokenGenerator(object):
+    """
+    Generates fixed-length hex tokens straight from the OS CSPRNG.
+    ``generate_many`` draws the bytes for all tokens in a single block.
+    """
+
+    def __init__(self, length=64):
+        if length % 2:
+            raise ValueError("length must be even")
+        self.length = length
+
+    def generate(self):
+        return binascii.hexlify(os.urandom(self.length // 2)).decode("ascii")
+
+    def generate_many(self, n):
+        data = binascii.hexlify(os.urandom(n * self.length // 2)).decode("ascii")
+        return [data[i:i + self.length] for i in range(0, len(data), self.length)]
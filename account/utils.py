@@ -8,13 +8,19 @@ except ImportError:  # python 2
 
 from django.core import urlresolvers
 from django.core.exceptions import SuspiciousOperation
+from django.db.models.functions import Lower
 from django.http import HttpResponseRedirect, QueryDict
 
 from django.contrib.auth import get_user_model
 
+import pytz
+
 from account.conf import settings
 
 
+_timezones = {}
+
+
 def get_user_lookup_kwargs(kwargs):
     result = {}
     username_field = getattr(get_user_model(), "USERNAME_FIELD", "username")
@@ -23,6 +29,70 @@ def get_user_lookup_kwargs(kwargs):
     return result
 
 
+def filter_by_username(queryset, username):
+    """
+    Filters a queryset of the user model case-insensitively on its
+    ``USERNAME_FIELD``. With ``ACCOUNT_USERNAME_CASE_INSENSITIVE_INDEX`` the
+    lookup compares ``LOWER(field)`` so it can use an index created with
+    ``account.operations.CreateLowerIndex``. Matches nothing for ``None``.
+    """
+    if username is None:
+        return queryset.none()
+    if settings.ACCOUNT_USERNAME_CASE_INSENSITIVE_INDEX:
+        username_field = getattr(queryset.model, "USERNAME_FIELD", "username")
+        queryset = queryset.annotate(account_username_lower=Lower(username_field))
+        return queryset.filter(account_username_lower=username.lower())
+    return queryset.filter(**get_user_lookup_kwargs({"{username}__iexact": username}))
+
+
+def normalize_email(email):
+    """
+    Returns the form of an email address stored in
+    ``EmailAddress.normalized_email`` and used for case-insensitive lookups.
+    """
+    return email.lower()
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of at most ``size`` items from the given iterable.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_timezone(name):
+    """
+    Returns the pytz timezone for the given name from a process-wide cache.
+    """
+    try:
+        return _timezones[name]
+    except KeyError:
+        tz = _timezones[name] = pytz.timezone(name)
+        return tz
+
+
+def warm_timezone_cache(names=None):
+    """
+    Loads the timezones in ``ACCOUNT_TIMEZONES`` (or the given names) into
+    the cache used by ``get_timezone``. Intended to be called at worker
+    start. Names unknown to the installed pytz are skipped.
+    """
+    if names is None:
+        names = [name for name, label in settings.ACCOUNT_TIMEZONES]
+    for name in names:
+        try:
+            get_timezone(name)
+        except pytz.UnknownTimeZoneError:
+            pass
+
+
 def default_redirect(request, fallback_url, **kwargs):
     redirect_field_name = kwargs.get("redirect_field_name", "next")
     next_url = request.POST.get(redirect_field_name, request.GET.get(redirect_field_name))
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+from django.db import transaction
 from django.http import Http404, HttpResponseForbidden
 from django.shortcuts import redirect, get_object_or_404
 from django.utils.http import base36_to_int, int_to_base36
@@ -13,18 +14,19 @@ from django.contrib.auth import get_user_model
 from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.auth.tokens import default_token_generator
 
-from account import signals
+from account import hashing, signals
 from account.conf import settings
-from account.forms import SignupForm, LoginUsernameForm
+from account.forms import SignupForm, LoginForm, LoginUsernameForm
 from account.forms import ChangePasswordForm, PasswordResetForm, PasswordResetTokenForm
 from account.forms import SettingsForm
 from account.hooks import hookset
-from account.mixins import LoginRequiredMixin
+from account.instrumentation import span
+from account.mixins import InstrumentedFormMixin, LoginRequiredMixin
 from account.models import SignupCode, EmailAddress, EmailConfirmation, Account, AccountDeletion
 from account.utils import default_redirect, get_form_data
 
 
-class SignupView(FormView):
+class SignupView(InstrumentedFormMixin, FormView):
 
     template_name = "account/signup.html"
     template_name_ajax = "account/ajax/signup.html"
@@ -33,6 +35,7 @@ class SignupView(FormView):
     template_name_signup_closed = "account/signup_closed.html"
     template_name_signup_closed_ajax = "account/ajax/signup_closed.html"
     form_class = SignupForm
+    span_name = "signup"
     form_kwargs = {}
     redirect_field_name = "next"
     identifier_field = "username"
@@ -123,20 +126,40 @@ class SignupView(FormView):
         return super(SignupView, self).form_invalid(form)
 
     def form_valid(self, form):
-        self.created_user = self.create_user(form, commit=False)
+        try:
+            with span("signup.create_user"):
+                self.created_user = self.create_user(form, commit=False)
+        except hashing.HashingUnavailable as e:
+            form.add_error(None, e.error_message)
+            return self.form_invalid(form)
         # prevent User post_save signal from creating an Account instance
         # we want to handle that ourself.
         self.created_user._disable_account_creation = True
-        self.created_user.save()
-        self.use_signup_code(self.created_user)
-        email_address = self.create_email_address(form)
+        try:
+            with transaction.atomic():
+                with span("signup.save_user"):
+                    self.created_user.save()
+                with span("signup.use_signup_code"):
+                    self.use_signup_code(self.created_user)
+        except SignupCode.InvalidCode:
+            # the code was used up or expired since it was checked; carry on
+            # as if no valid code had been given.
+            self.signup_code = None
+            if not self.is_open():
+                return self.closed()
+            return self.form_valid(form)
+        with span("signup.create_email_address"):
+            email_address = self.create_email_address(form)
         if settings.ACCOUNT_EMAIL_CONFIRMATION_REQUIRED and not email_address.verified:
             self.created_user.is_active = False
             self.created_user.save()
-        self.create_account(form)
-        self.after_signup(form)
+        with span("signup.create_account"):
+            self.create_account(form)
+        with span("signup.after_signup"):
+            self.after_signup(form)
         if settings.ACCOUNT_EMAIL_CONFIRMATION_EMAIL and not email_address.verified:
-            self.send_email_confirmation(email_address)
+            with span("signup.send_email_confirmation"):
+                self.send_email_confirmation(email_address)
         if settings.ACCOUNT_EMAIL_CONFIRMATION_REQUIRED and not email_address.verified:
             return self.email_confirmation_required_response()
         else:
@@ -157,7 +180,8 @@ class SignupView(FormView):
             # API. this should only be relied on by d-u-a and it is not a stable
             # API for site developers.
             self.form = form
-            self.login_user()
+            with span("signup.login_user"):
+                self.login_user()
         return redirect(self.get_success_url())
 
     def get_success_url(self, fallback_url=None, **kwargs):
@@ -181,7 +205,7 @@ class SignupView(FormView):
         user.email = form.cleaned_data["email"].strip()
         password = form.cleaned_data.get("password")
         if password:
-            user.set_password(password)
+            hashing.set_password(user, password)
         else:
             user.set_unusable_password()
         if commit:
@@ -227,6 +251,8 @@ class SignupView(FormView):
             user.backend = "django.contrib.auth.backends.ModelBackend"
         auth.login(self.request, user)
         self.request.session.set_expiry(0)
+        if settings.ACCOUNT_SESSION_PREFERENCES:
+            self.created_user.account.store_preferences(self.request.session)
 
     def user_credentials(self):
         return hookset.get_user_credentials(self.form, self.identifier_field)
@@ -276,11 +302,12 @@ class SignupView(FormView):
         return self.response_class(**response_kwargs)
 
 
-class LoginView(FormView):
+class LoginView(InstrumentedFormMixin, FormView):
 
     template_name = "account/login.html"
     template_name_ajax = "account/ajax/login.html"
     form_class = LoginUsernameForm
+    span_name = "login"
     form_kwargs = {}
     redirect_field_name = "next"
 
@@ -306,6 +333,8 @@ class LoginView(FormView):
 
     def get_form_kwargs(self):
         kwargs = super(LoginView, self).get_form_kwargs()
+        if issubclass(self.get_form_class(), LoginForm):
+            kwargs["request"] = self.request
         kwargs.update(self.form_kwargs)
         return kwargs
 
@@ -313,13 +342,17 @@ class LoginView(FormView):
         signals.user_login_attempt.send(
             sender=LoginView,
             username=get_form_data(form, form.identifier_field),
-            result=form.is_valid()
+            result=form.is_valid(),
+            request=self.request,
+            throttled=getattr(form, "throttled", False)
         )
         return super(LoginView, self).form_invalid(form)
 
     def form_valid(self, form):
-        self.login_user(form)
-        self.after_login(form)
+        with span("login.login_user"):
+            self.login_user(form)
+        with span("login.after_login"):
+            self.after_login(form)
         return redirect(self.get_success_url())
 
     def after_login(self, form):
@@ -338,6 +371,10 @@ class LoginView(FormView):
         auth.login(self.request, form.user)
         expiry = settings.ACCOUNT_REMEMBER_ME_EXPIRY if form.cleaned_data.get("remember") else 0
         self.request.session.set_expiry(expiry)
+        if settings.ACCOUNT_SESSION_PREFERENCES:
+            account = Account.for_request(self.request)
+            if isinstance(account, Account):
+                account.store_preferences(self.request.session)
 
 
 class LogoutView(TemplateResponseMixin, View):
@@ -446,10 +483,11 @@ class ConfirmEmailView(TemplateResponseMixin, View):
         user.save()
 
 
-class ChangePasswordView(FormView):
+class ChangePasswordView(InstrumentedFormMixin, FormView):
 
     template_name = "account/password_change.html"
     form_class = ChangePasswordForm
+    span_name = "password_change"
     redirect_field_name = "next"
     messages = {
         "password_changed": {
@@ -470,7 +508,7 @@ class ChangePasswordView(FormView):
 
     def change_password(self, form):
         user = self.request.user
-        user.set_password(form.cleaned_data["password_new"])
+        hashing.set_password(user, form.cleaned_data["password_new"])
         user.save()
         # required on Django >= 1.7 to keep the user authenticated
         if hasattr(auth, "update_session_auth_hash"):
@@ -501,8 +539,14 @@ class ChangePasswordView(FormView):
         return kwargs
 
     def form_valid(self, form):
-        self.change_password(form)
-        self.after_change_password()
+        try:
+            with span("password_change.change_password"):
+                self.change_password(form)
+        except hashing.HashingUnavailable as e:
+            form.add_error(None, e.error_message)
+            return self.form_invalid(form)
+        with span("password_change.after_change_password"):
+            self.after_change_password()
         return redirect(self.get_success_url())
 
     def get_context_data(self, **kwargs):
@@ -534,11 +578,12 @@ class ChangePasswordView(FormView):
         hookset.send_password_change_email([user.email], ctx)
 
 
-class PasswordResetView(FormView):
+class PasswordResetView(InstrumentedFormMixin, FormView):
 
     template_name = "account/password_reset.html"
     template_name_sent = "account/password_reset_sent.html"
     form_class = PasswordResetForm
+    span_name = "password_reset"
     token_generator = default_token_generator
 
     def get_context_data(self, **kwargs):
@@ -548,7 +593,8 @@ class PasswordResetView(FormView):
         return context
 
     def form_valid(self, form):
-        self.send_email(form.cleaned_data["email"])
+        with span("password_reset.send_email"):
+            self.send_email(form.cleaned_data["email"])
         response_kwargs = {
             "request": self.request,
             "template": self.template_name_sent,
@@ -560,7 +606,7 @@ class PasswordResetView(FormView):
         User = get_user_model()
         protocol = getattr(settings, "DEFAULT_HTTP_PROTOCOL", "http")
         current_site = get_current_site(self.request)
-        email_qs = EmailAddress.objects.filter(email__iexact=email)
+        email_qs = EmailAddress.objects.for_email(email)
         for user in User.objects.filter(pk__in=email_qs.values("user")):
             uid = int_to_base36(user.id)
             token = self.make_token(user)
@@ -580,11 +626,12 @@ class PasswordResetView(FormView):
         return self.token_generator.make_token(user)
 
 
-class PasswordResetTokenView(FormView):
+class PasswordResetTokenView(InstrumentedFormMixin, FormView):
 
     template_name = "account/password_reset_token.html"
     template_name_fail = "account/password_reset_token_fail.html"
     form_class = PasswordResetTokenForm
+    span_name = "password_reset_token"
     token_generator = default_token_generator
     redirect_field_name = "next"
     messages = {
@@ -615,7 +662,7 @@ class PasswordResetTokenView(FormView):
 
     def change_password(self, form):
         user = self.get_user()
-        user.set_password(form.cleaned_data["password"])
+        hashing.set_password(user, form.cleaned_data["password"])
         user.save()
 
     def after_change_password(self):
@@ -631,8 +678,14 @@ class PasswordResetTokenView(FormView):
             )
 
     def form_valid(self, form):
-        self.change_password(form)
-        self.after_change_password()
+        try:
+            with span("password_reset_token.change_password"):
+                self.change_password(form)
+        except hashing.HashingUnavailable as e:
+            form.add_error(None, e.error_message)
+            return self.form_invalid(form)
+        with span("password_reset_token.after_change_password"):
+            self.after_change_password()
         return redirect(self.get_success_url())
 
     def get_redirect_field_name(self):
@@ -748,6 +801,8 @@ class SettingsView(LoginRequiredMixin, FormView):
             for k, v in fields.items():
                 setattr(account, k, v)
             account.save()
+            if settings.ACCOUNT_SESSION_PREFERENCES:
+                account.store_preferences(self.request.session)
 
     def get_redirect_field_name(self):
         return self.redirect_field_name
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of token generation: the previous SHA-256 over
+SystemRandom().getrandbits(512) against account.tokens.RandomTokenGenerator.
+
+    python benchmarks/tokens.py [number]
+"""
+from __future__ import print_function
+
+import hashlib
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from account.tokens import RandomTokenGenerator  # noqa
+
+
+def legacy_token(email="user@example.com"):
+    bits = [email, str(random.SystemRandom().getrandbits(512))]
+    return hashlib.sha256("".join(bits).encode("utf-8")).hexdigest()
+
+
+def run(number=100000):
+    generator = RandomTokenGenerator()
+    cases = [
+        ("sha256(getrandbits(512))", legacy_token),
+        ("RandomTokenGenerator.generate", generator.generate),
+        ("RandomTokenGenerator.generate_many (per token)", lambda: generator.generate_many(number)),
+    ]
+    results = {}
+    for name, func in cases:
+        if "generate_many" in name:
+            seconds = timeit.timeit(func, number=1)
+        else:
+            seconds = timeit.timeit(func, number=number)
+        results[name] = seconds / number * 1e6
+    return results
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, usec in sorted(run(number).items(), key=lambda item: -item[1]):
+        print("{0:<50} {1:8.3f} usec/token".format(name, usec))
+
+
+if __name__ == "__main__":
+    main()
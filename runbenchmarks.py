@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""
+Times the account flows end to end through the test client and counts
+their queries, against a SQLite database seeded with a given number of
+users. Prints a JSON report:
+
+    python runbenchmarks.py --users 10000,100000 --repeat 20 --output bench.json
+
+Compare two reports with ``--compare old.json``.
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+
+from django.conf import settings
+
+from runtests import DEFAULT_SETTINGS
+
+
+BENCHMARK_SETTINGS = dict(
+    DEFAULT_SETTINGS,
+    DEBUG=False,
+    ALLOWED_HOSTS=["*"],
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    AUTHENTICATION_BACKENDS=[
+        "account.auth_backends.UsernameAuthenticationBackend",
+        "account.auth_backends.EmailAuthenticationBackend",
+    ],
+)
+
+PASSWORD = "benchmark"
+
+
+def seed(count, batch_size=5000):
+    """
+    Creates ``count`` users, each with an account and a verified primary
+    email address. The password is hashed once and shared.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from account.models import Account, EmailAddress
+
+    encoded = make_password(PASSWORD)
+    start = User.objects.filter(username__startswith="user").count()
+    for offset in range(start, count, batch_size):
+        users = [
+            User(username="user{0}".format(i), email="user{0}@example.com".format(i), password=encoded)
+            for i in range(offset, min(offset + batch_size, count))
+        ]
+        User.objects.bulk_create(users)
+        users = User.objects.filter(username__in=[user.username for user in users])
+        Account.bulk_create_for_users(users)
+    EmailAddress.objects.filter(verified=False).update(verified=True)
+
+
+class Flow(object):
+    """
+    A benchmarked request or operation. ``setup`` runs untimed before
+    every iteration and returns the arguments passed to ``run``.
+    """
+
+    name = None
+
+    def __init__(self, size):
+        from django.test import Client
+        self.client = Client()
+        self.size = size
+        self.counter = 0
+
+    def next_user(self):
+        from django.contrib.auth.models import User
+        self.counter += 1
+        return User.objects.get(username="user{0}".format((self.counter * 7919) % self.size))
+
+    def setup(self):
+        return ()
+
+    def run(self, *args):
+        raise NotImplementedError()
+
+    def check(self, response, status_code=302):
+        if response.status_code != status_code:
+            raise AssertionError("{0}: unexpected status {1}".format(self.name, response.status_code))
+
+
+class SignupFlow(Flow):
+
+    name = "signup"
+
+    def setup(self):
+        self.client.logout()
+        self.counter += 1
+        return ("signup{0}".format(self.counter),)
+
+    def run(self, username):
+        self.check(self.client.post("/signup/", {
+            "username": username,
+            "password": PASSWORD,
+            "password_confirm": PASSWORD,
+            "email": "{0}@example.org".format(username),
+        }))
+
+
+class LoginUsernameFlow(Flow):
+
+    name = "login_username"
+
+    def setup(self):
+        self.client.logout()
+        return (self.next_user().username,)
+
+    def run(self, username):
+        self.check(self.client.post("/login/", {"username": username, "password": PASSWORD}))
+
+
+class LoginEmailFlow(Flow):
+
+    name = "login_email"
+
+    def setup(self):
+        self.client.logout()
+        return (self.next_user().email,)
+
+    def run(self, email):
+        self.check(self.client.post("/login/email/", {"email": email, "password": PASSWORD}))
+
+
+class ConfirmEmailFlow(Flow):
+
+    name = "confirm_email"
+
+    def setup(self):
+        from account.models import EmailAddress, EmailConfirmation
+        user = self.next_user()
+        email_address = EmailAddress.objects.create(
+            user=user,
+            email="confirm{0}@example.org".format(self.counter)
+        )
+        return (EmailConfirmation.create(email_address).key,)
+
+    def run(self, key):
+        self.check(self.client.post("/confirm_email/{0}/".format(key)))
+
+
+class PasswordResetRequestFlow(Flow):
+
+    name = "password_reset_request"
+
+    def setup(self):
+        return (self.next_user().email,)
+
+    def run(self, email):
+        self.check(self.client.post("/password/reset/", {"email": email}), 200)
+
+
+class PasswordResetConsumeFlow(Flow):
+
+    name = "password_reset_consume"
+
+    def setup(self):
+        from django.contrib.auth.tokens import default_token_generator
+        from django.utils.http import int_to_base36
+        user = self.next_user()
+        return ("/password/reset/{0}-{1}/".format(
+            int_to_base36(user.pk),
+            default_token_generator.make_token(user)
+        ),)
+
+    def run(self, url):
+        self.check(self.client.post(url, {"password": PASSWORD, "password_confirm": PASSWORD}))
+
+
+class SettingsUpdateFlow(Flow):
+
+    name = "settings_update"
+
+    def setup(self):
+        user = self.next_user()
+        self.client.login(username=user.username, password=PASSWORD)
+        return (user.email,)
+
+    def run(self, email):
+        self.check(self.client.post("/settings/", {
+            "email": email,
+            "timezone": "Europe/Berlin",
+            "language": "en",
+        }))
+
+
+class DeletionMarkFlow(Flow):
+
+    name = "deletion_mark"
+
+    def setup(self):
+        self.client.login(username=self.next_user().username, password=PASSWORD)
+        return ()
+
+    def run(self):
+        self.check(self.client.post("/delete/"))
+
+
+class ExpungeFlow(Flow):
+    """
+    Expunges 100 deletions per iteration.
+    """
+
+    name = "expunge"
+    batch = 100
+
+    def setup(self):
+        import datetime
+        from django.utils import timezone
+        from account.models import AccountDeletion
+        past = timezone.now() - datetime.timedelta(hours=settings.ACCOUNT_DELETION_EXPUNGE_HOURS + 1)
+        for _ in range(self.batch):
+            AccountDeletion.mark(self.next_user())
+        AccountDeletion.objects.filter(date_expunged__isnull=True).update(date_requested=past)
+        return ()
+
+    def run(self):
+        from account.models import AccountDeletion
+        AccountDeletion.expunge()
+
+
+FLOWS = [
+    SignupFlow,
+    LoginUsernameFlow,
+    LoginEmailFlow,
+    ConfirmEmailFlow,
+    PasswordResetRequestFlow,
+    PasswordResetConsumeFlow,
+    SettingsUpdateFlow,
+    DeletionMarkFlow,
+    ExpungeFlow,
+]
+
+
+def measure(flow, repeat):
+    from django.core import mail
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings, queries = [], []
+    for _ in range(repeat):
+        args = flow.setup()
+        mail.outbox = []
+        with CaptureQueriesContext(connection) as context:
+            start = time.time()
+            flow.run(*args)
+            timings.append(time.time() - start)
+        queries.append(len(context.captured_queries))
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": timings[0] * 1000,
+        "median_ms": timings[len(timings) // 2] * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "max_ms": timings[-1] * 1000,
+        "queries": max(queries),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT
+        ).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def setup_database(path):
+    from django.core.management import call_command
+    from django.db import connections
+
+    connections["default"].close()
+    connections["default"].settings_dict["NAME"] = path
+    call_command("migrate", verbosity=0, interactive=False)
+
+
+def runbenchmarks(sizes, repeat, flows, database, fast_hasher):
+    if not settings.configured:
+        options = dict(BENCHMARK_SETTINGS)
+        if fast_hasher:
+            options["PASSWORD_HASHERS"] = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+        settings.configure(**options)
+
+    django.setup()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": "sqlite3",
+        "password_hashers": settings.PASSWORD_HASHERS[:1],
+        "results": {},
+    }
+    directory = None
+    if not database:
+        directory = tempfile.mkdtemp()
+        database = os.path.join(directory, "benchmark-{size}.sqlite3")
+    try:
+        for size in sizes:
+            run_size(report, size, database.format(size=size), repeat, flows)
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+    return report
+
+
+def run_size(report, size, path, repeat, flows):
+    setup_database(path)
+    start = time.time()
+    seed(size)
+    print("seeded {0} users in {1:.1f}s".format(size, time.time() - start), file=sys.stderr)
+    results = report["results"][str(size)] = {}
+    for flow_class in FLOWS:
+        if flows and flow_class.name not in flows:
+            continue
+        results[flow_class.name] = measure(flow_class(size), repeat)
+        print("  {0:<24} {1[median_ms]:9.2f} ms {1[queries]:4d} queries".format(
+            flow_class.name, results[flow_class.name]
+        ), file=sys.stderr)
+
+
+def compare(old, new):
+    for size, results in sorted(new["results"].items()):
+        for name, result in sorted(results.items()):
+            previous = old["results"].get(size, {}).get(name)
+            if previous is None:
+                continue
+            print("{0:>8} {1:<24} {2:+8.1%} time {3:+4d} queries".format(
+                size,
+                name,
+                result["median_ms"] / previous["median_ms"] - 1,
+                result["queries"] - previous["queries"]
+            ), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the account flows.")
+    parser.add_argument("--users", default="10000", help="comma separated table sizes to seed (e.g. 10000,100000,1000000)")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per flow")
+    parser.add_argument("--flow", action="append", dest="flows", help="run only the named flow (repeatable)")
+    parser.add_argument("--database", help="SQLite file path, may contain {size}; defaults to temporary files")
+    parser.add_argument("--fast-hasher", action="store_true", help="use MD5 to leave password hashing out of the timings")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON report to compare the results against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.users.split(",")]
+    report = runbenchmarks(sizes, args.repeat, args.flows, args.database, args.fast_hasher)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(json.load(fp), report)
+
+
+if __name__ == "__main__":
+    main()